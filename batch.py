@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from price_store import PriceStore
+from repository import repository, with_timeout
+
+# Most symbols accepted by one batch request
+MAX_BATCH_SYMBOLS = 100
+
+
+def parse_symbols(symbols: str) -> List[str]:
+    """Split a comma-separated ``symbols`` parameter into unique upper-case symbols"""
+    parsed = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols.split(",") if symbol.strip()))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="symbols must list at least one symbol")
+    if len(parsed) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+    return parsed
+
+
+async def get_price_histories(store: PriceStore, symbols: List[str], days: int = 30) -> Dict[str, List[Dict[str, Any]]]:
+    """Latest ``days`` bars per symbol, newest first - from the price store, else one query"""
+    if await store.ensure_loaded():
+        return {symbol: store.history(symbol, days) for symbol in symbols}
+    histories = {symbol: [] for symbol in symbols}
+    for row in await repository.get_price_histories(store.table, symbols, days):
+        histories[row["symbol"]].append(row)
+    return histories
+
+
+async def get_stock_quotes(symbols: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Stock details with latest price, previous close and fundamentals per symbol (null when unknown)"""
+    stocks, snapshots = await asyncio.gather(
+        repository.get_stocks_by_symbols(symbols),
+        with_timeout(repository.get_snapshots_by_symbols('stock', symbols), default=[]),
+    )
+    found = {stock["symbol"]: stock for stock in stocks}
+    latest = {snapshot["symbol"]: snapshot for snapshot in snapshots}
+    return {
+        symbol: {
+            **found[symbol],
+            "latest_price": latest.get(symbol, {}).get("latest_price"),
+            "previous_close": latest.get(symbol, {}).get("previous_close"),
+            "fundamentals": latest.get(symbol, {}).get("fundamentals"),
+        } if symbol in found else None
+        for symbol in symbols
+    }
+
+
+async def get_etf_quotes(symbols: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """ETF details with latest price and previous close per symbol (null when unknown)"""
+    etfs, snapshots = await asyncio.gather(
+        repository.get_etfs_by_symbols(symbols),
+        with_timeout(repository.get_snapshots_by_symbols('etf', symbols), default=[]),
+    )
+    found = {etf["symbol"]: etf for etf in etfs}
+    latest = {snapshot["symbol"]: snapshot for snapshot in snapshots}
+    return {
+        symbol: {
+            **found[symbol],
+            "latest_price": latest.get(symbol, {}).get("latest_price"),
+            "previous_close": latest.get(symbol, {}).get("previous_close"),
+        } if symbol in found else None
+        for symbol in symbols
+    }
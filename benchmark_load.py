@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+# Weighted request mix: (name, weight, method, path template); weights roughly follow a dashboard's traffic.
+# Placeholders are filled from the universe of symbols, sectors and categories the target serves.
+WORKLOAD = (
+    ("stock", 12, "GET", "/api/stocks/{stock}"),
+    ("stock_prices", 10, "GET", "/api/stocks/{stock}/prices?days={days}"),
+    ("stock_prices_interval", 2, "GET", "/api/stocks/{stock}/prices?days=365&interval={interval}"),
+    ("stock_prices_ndjson", 2, "GET", "/api/stocks/{stock}/prices?days=730&format=ndjson"),
+    ("stock_prices_csv", 1, "GET", "/api/stocks/{stock}/prices?days=730&format=csv"),
+    ("stock_technical", 4, "GET", "/api/stocks/{stock}/technical"),
+    ("stock_etfs", 3, "GET", "/api/stocks/{stock}/etfs"),
+    ("stocks_batch", 4, "GET", "/api/stocks/batch?symbols={stocks}"),
+    ("stocks_batch_prices", 2, "GET", "/api/stocks/batch/prices?symbols={stocks}&days={days}"),
+    ("etfs", 5, "GET", "/api/etfs"),
+    ("etf", 6, "GET", "/api/etfs/{etf}"),
+    ("etf_prices", 6, "GET", "/api/etfs/{etf}/prices?days={days}"),
+    ("etf_prices_interval", 1, "GET", "/api/etfs/{etf}/prices?days=365&interval={interval}"),
+    ("etf_prices_csv", 1, "GET", "/api/etfs/{etf}/prices?days=730&format=csv"),
+    ("etf_holdings", 4, "GET", "/api/etfs/{etf}/holdings"),
+    ("etf_top_holdings", 3, "GET", "/api/etfs/{etf}/top-holdings"),
+    ("etfs_batch", 2, "GET", "/api/etfs/batch?symbols={etfs}"),
+    ("etfs_batch_prices", 1, "GET", "/api/etfs/batch/prices?symbols={etfs}&days={days}"),
+    ("etfs_category", 2, "GET", "/api/etfs/category/{category}"),
+    ("etfs_leveraged", 1, "GET", "/api/etfs/leveraged"),
+    ("etfs_holding", 2, "GET", "/api/etfs/holding?stocks={holding}"),
+    ("etfs_overlap", 1, "GET", "/api/etfs/overlap?symbols={etfs}"),
+    ("portfolio_exposure", 2, "POST", "/api/portfolio/exposure"),
+    ("sectors", 6, "GET", "/api/sectors"),
+    ("sectors_top", 4, "GET", "/api/sectors/top-performers?period={period}"),
+    ("sector_stocks", 3, "GET", "/api/sectors/{sector}/stocks"),
+    ("screener", 4, "POST", "/api/screener"),
+    ("screener_gainers", 4, "GET", "/api/screener/gainers?limit=20"),
+    ("screener_losers", 3, "GET", "/api/screener/losers?limit=20"),
+    ("health", 1, "GET", "/health"),
+    ("cache_stats", 1, "GET", "/api/cache/stats"),
+    ("metrics", 1, "GET", "/metrics"),
+    # Writes: only sent to a server this script seeded itself, or with --writes
+    ("create_stock", 1, "POST", "/api/stocks"),
+    ("upsert_stock_prices", 2, "POST", "/api/stocks/prices"),
+    ("upsert_etf_prices", 1, "POST", "/api/etfs/prices"),
+)
+WRITES = {"create_stock", "upsert_stock_prices", "upsert_etf_prices"}
+
+PERIODS = ("1d", "1w", "1m", "ytd")
+DAYS = (7, 30, 90, 365)
+INTERVALS = ("1w", "1m", "1q")
+# Minimum holding weights (percent) of the stocks in an /api/etfs/holding query
+MIN_WEIGHTS = (0, 0.5, 1)
+
+
+def seed(db_path: str, seed_value: int = 42):
+    """Create a SQLite database at ``db_path`` from the seed data generators"""
+    # The global backend is built from these on first use
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_DB_PATH"] = db_path
+
+    from bulk_loader import BulkLoader
+    from create_comprehensive_data import create_comprehensive_data
+    from create_etf_data import create_comprehensive_etf_data, etf_rows
+    from create_etf_holdings import create_etf_holdings_data
+    from repository import create_repository
+
+    random.seed(seed_value)
+    backend = create_repository("sqlite")
+    loader = BulkLoader(backend)
+
+    # The generators narrate every symbol; keep the loader reports only
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = create_comprehensive_data()
+        etf_data = create_comprehensive_etf_data()
+    loader.load_all([
+        ("sectors", data["sectors"]),
+        ("stocks", data["stocks"]),
+        ("stock_prices", data["stock_prices"]),
+        ("fundamentals", data["fundamentals"]),
+        ("technical_indicators", data["technical_indicators"]),
+        ("etfs", etf_rows(etf_data["etfs"])),
+        ("etf_prices", etf_data["etf_prices"]),
+    ])
+    with contextlib.redirect_stdout(io.StringIO()):
+        holdings = create_etf_holdings_data(backend)
+    loader.load("etf_holdings", holdings)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(db_path: str, workers: int = 1, timeout: float = 30.0):
+    """Run the app under uvicorn against the SQLite database; yields its base URL"""
+    port = _free_port()
+    env = {**os.environ, "DB_BACKEND": "sqlite", "SQLITE_DB_PATH": db_path}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"App did not become healthy within {timeout:.0f}s")
+            time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def discover(client: httpx.AsyncClient) -> Dict[str, list]:
+    """Symbols, sectors and categories to draw request parameters from, read through the API"""
+    sectors = [row["name"] for row in (await client.get("/api/sectors")).json()]
+    etfs = (await client.get("/api/etfs")).json()
+    stocks = []
+    for sector in sectors:
+        stocks += [row["symbol"] for row in (await client.get(f"/api/sectors/{sector}/stocks")).json()]
+    if not stocks or not etfs:
+        raise RuntimeError("The target has no stocks or ETFs; seed it first")
+    return {
+        "stock": sorted(set(stocks)),
+        "etf": [row["symbol"] for row in etfs],
+        "sector": sectors,
+        "category": sorted({row["category"] for row in etfs if row.get("category")}),
+    }
+
+
+def _price_bar(rng: random.Random, symbol: str) -> dict:
+    close = round(rng.uniform(20, 500), 2)
+    return {
+        "symbol": symbol,
+        "date": date.today().isoformat(),
+        "open_price": close,
+        "high_price": round(close * 1.01, 2),
+        "low_price": round(close * 0.99, 2),
+        "close_price": close,
+        "volume": rng.randint(100_000, 10_000_000),
+    }
+
+
+def build_request(rng: random.Random, universe: Dict[str, list], name: str, method: str, template: str,
+                  sequence: int):
+    """The (method, path, JSON body) of one request of kind ``name``"""
+    path = template.format(
+        stock=rng.choice(universe["stock"]),
+        etf=rng.choice(universe["etf"]),
+        sector=rng.choice(universe["sector"]),
+        category=rng.choice(universe["category"] or [""]),
+        stocks=",".join(rng.sample(universe["stock"], min(10, len(universe["stock"])))),
+        etfs=",".join(rng.sample(universe["etf"], min(5, len(universe["etf"])))),
+        holding=",".join(f"{symbol}:{rng.choice(MIN_WEIGHTS)}"
+                         for symbol in rng.sample(universe["stock"], min(2, len(universe["stock"])))),
+        period=rng.choice(PERIODS),
+        days=rng.choice(DAYS),
+        interval=rng.choice(INTERVALS),
+    )
+    body = None
+    if name == "screener":
+        body = {"min_market_cap": rng.choice([None, 1e9, 1e10, 1e11]), "max_pe_ratio": rng.choice([None, 20, 40]),
+                "sort_by": rng.choice(["market_cap", "pe_ratio", "roe"]), "limit": 50}
+    elif name == "portfolio_exposure":
+        body = {"positions": [{"symbol": symbol, "value": rng.randint(1_000, 100_000)}
+                              for symbol in rng.sample(universe["etf"], min(5, len(universe["etf"])))],
+                "limit": 20}
+    elif name == "create_stock":
+        body = {"symbol": f"LT{os.getpid()}X{sequence}", "name": "Load Test Corp", "sector": rng.choice(universe["sector"]),
+                "industry": "Benchmarking", "market_cap": rng.randint(10**8, 10**11)}
+    elif name == "upsert_stock_prices":
+        body = [_price_bar(rng, rng.choice(universe["stock"]))]
+    elif name == "upsert_etf_prices":
+        body = [_price_bar(rng, rng.choice(universe["etf"]))]
+    return method, path, body
+
+
+class Recorder:
+    """Latencies and status codes per request kind"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, seconds: float, status: str):
+        self.latencies.setdefault(name, []).append(seconds)
+        counts = self.statuses.setdefault(name, {})
+        counts[status] = counts.get(status, 0) + 1
+
+
+async def drive(client: httpx.AsyncClient, universe: Dict[str, list], duration: float, concurrency: int,
+                writes: bool, seed_value: int) -> Recorder:
+    """Closed-loop traffic: ``concurrency`` workers each send the next request as soon as one completes"""
+    workload = [entry for entry in WORKLOAD if writes or entry[0] not in WRITES]
+    weights = [entry[1] for entry in workload]
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(seed_value * 1000 + worker_id)
+        sequence = 0
+        while time.perf_counter() < deadline:
+            name, _, method, template = rng.choices(workload, weights)[0]
+            sequence += 1
+            method, path, body = build_request(rng, universe, name, method, template, worker_id * 10**7 + sequence)
+            start_time = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            recorder.record(name, time.perf_counter() - start_time, status)
+
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    return recorder
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: List[float], statuses: Dict[str, int], seconds: float) -> dict:
+    ordered = sorted(latencies)
+    # Every request in the mix is valid, so any 4xx (e.g. a shadowed route's 404) is an error too
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "status": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(ordered) / seconds, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def report(recorder: Recorder, seconds: float, meta: dict) -> dict:
+    """Per-endpoint and overall throughput and latency percentiles"""
+    endpoints = {name: _summary(recorder.latencies[name], recorder.statuses[name], seconds)
+                 for name in sorted(recorder.latencies)}
+    all_statuses: Dict[str, int] = {}
+    for counts in recorder.statuses.values():
+        for status, count in counts.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    all_latencies = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    return {"meta": meta, "total": _summary(all_latencies, all_statuses, seconds), "endpoints": endpoints}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: dict, baseline: Optional[dict] = None):
+    header = (f"{'endpoint':<22} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'max ms':>8}")
+    if baseline is not None:
+        header += f" {'Δp50':>7} {'Δp99':>7} {'Δrps':>7}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, stats in rows:
+        line = (f"{name:<22} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_rps']:>8.1f} "
+                f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+        if baseline is not None:
+            before = baseline["total"] if name == "TOTAL" else baseline["endpoints"].get(name)
+            if before:
+                line += "".join(f" {_change(before[key], stats[key]):>7}"
+                                for key in ("p50_ms", "p99_ms", "throughput_rps"))
+        print(line)
+
+
+def _change(before: float, after: float) -> str:
+    return f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+
+
+async def run_benchmark(base_url: Optional[str], app=None, duration: float = 30.0, warmup: float = 5.0,
+                        concurrency: int = 32, writes: bool = True, seed_value: int = 42) -> dict:
+    """Warm up, then drive mixed traffic for ``duration`` seconds against ``base_url`` (or ``app`` in process)"""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if app is not None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                   timeout=30.0)
+    else:
+        client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0)
+
+    async with client:
+        universe = await discover(client)
+        if warmup > 0:
+            await drive(client, universe, warmup, concurrency, writes, seed_value + 1)
+        start_time = time.perf_counter()
+        recorder = await drive(client, universe, duration, concurrency, writes, seed_value)
+        seconds = time.perf_counter() - start_time
+
+    meta = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "target": "in-process" if app is not None else base_url,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration_s": round(seconds, 2),
+        "warmup_s": warmup,
+        "concurrency": concurrency,
+        "writes": writes,
+        "seed": seed_value,
+    }
+    return report(recorder, seconds, meta)
+
+
+async def _run_in_process(**kwargs) -> dict:
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        return await run_benchmark(None, app=app, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load-test every route with a weighted request mix and report latency percentiles per endpoint")
+    parser.add_argument("--url", help="Benchmark an already running server instead of a seeded local one")
+    parser.add_argument("--db", help="SQLite database to serve (default: a freshly seeded temporary one)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Call the app in process (no uvicorn, no sockets) instead of over HTTP")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds of traffic first")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--writes", action="store_true", help="Include writes when benchmarking --url")
+    parser.add_argument("--read-only", action="store_true", help="Leave the write endpoints out of the mix")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the generated data and the request mix")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--baseline", help="A previous JSON report to compare against")
+    args = parser.parse_args()
+
+    options = dict(duration=args.duration, warmup=args.warmup, concurrency=args.concurrency, seed_value=args.seed,
+                   writes=not args.read_only and (args.writes or args.url is None))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.url:
+            result = asyncio.run(run_benchmark(args.url.rstrip("/"), **options))
+        else:
+            db_path = args.db
+            if db_path is None:
+                db_path = os.path.join(workdir, "benchmark.db")
+                print(f"Seeding {db_path}...")
+                seed(db_path, args.seed)
+            if args.in_process:
+                os.environ["DB_BACKEND"] = "sqlite"
+                os.environ["SQLITE_DB_PATH"] = db_path
+                result = asyncio.run(_run_in_process(**options))
+            else:
+                with serve(db_path, args.workers) as url:
+                    result = asyncio.run(run_benchmark(url, **options))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print()
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from serialization import FastJSONResponse, orjson
+from compression import brotli
+
+ENDPOINTS = (
+    "/api/sectors",
+    "/api/etfs",
+    "/api/etfs/SPY/holdings",
+    "/api/stocks/AAPL/prices?days=730",
+    "/api/etfs/SPY/prices?days=730",
+    "/api/screener/gainers?limit=50",
+)
+
+
+def _median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(timings)
+
+
+def _wire_bytes(client: TestClient, path: str, encoding: str) -> int:
+    response = client.get(path, headers={"Accept-Encoding": encoding})
+    # Compressed responses carry their on-the-wire length; the client has already decoded the body
+    return int(response.headers.get("content-length", len(response.content)))
+
+
+def run(endpoints=ENDPOINTS, repeat: int = 50):
+    """Serialization time and bytes on the wire per endpoint, before and after"""
+    from main import app
+
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}; "
+          f"compression: {', '.join(encodings[1:])}; median of {repeat} runs\n")
+    header = f"{'endpoint':<36} {'default ms':>10} {'fast ms':>8} {'speedup':>7}" + "".join(
+        f" {encoding + ' B':>11}" for encoding in encodings)
+    print(header)
+    print("-" * len(header))
+
+    with TestClient(app) as client:
+        for path in endpoints:
+            response = client.get(path, headers={"Accept-Encoding": "identity"})
+            if response.status_code != 200:
+                print(f"{path:<36} HTTP {response.status_code}")
+                continue
+            payload = response.json()
+
+            # Before: jsonable_encoder + stdlib json; after: FastJSONResponse on the plain rows
+            default_ms = _median_ms(lambda: JSONResponse(jsonable_encoder(payload)), repeat)
+            fast_ms = _median_ms(lambda: FastJSONResponse(payload), repeat)
+            sizes = [_wire_bytes(client, path, encoding) for encoding in encodings]
+
+            print(f"{path:<36} {default_ms:>10.2f} {fast_ms:>8.2f} {default_ms / fast_ms:>6.1f}x"
+                  + "".join(f" {size:>11,}" for size in sizes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization and response compression per endpoint")
+    parser.add_argument("--repeat", type=int, default=50, help="Timing runs per endpoint")
+    parser.add_argument("endpoints", nargs="*", help="Paths to benchmark (default: a fixed set of large endpoints)")
+    args = parser.parse_args()
+    run(args.endpoints or ENDPOINTS, args.repeat)
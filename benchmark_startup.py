@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from benchmark_load import seed
+
+# Seconds `import main` may take in a fresh interpreter before the benchmark fails
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.0"))
+
+# Run in a fresh interpreter per sample, so every import is cold
+_CHILD = """
+import asyncio, json, sys, time
+start_time = time.perf_counter()
+import main
+import_s = time.perf_counter() - start_time
+
+async def measure():
+    import httpx
+    started = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            response = await client.get(sys.argv[1])
+        done = time.perf_counter()
+    return ready - started, done - ready, response.status_code
+
+startup_s, first_request_s, status = asyncio.run(measure())
+print(json.dumps({"import_s": import_s, "startup_s": startup_s, "first_request_s": first_request_s,
+                  "status": status, "modules": len(sys.modules)}))
+"""
+
+
+def _environment(db_path: str, warmup: str) -> Dict[str, str]:
+    env = dict(os.environ, DB_BACKEND="sqlite", SQLITE_DB_PATH=db_path, STARTUP_WARMUP=warmup)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get("PYTHONPATH")]))
+    return env
+
+
+def sample(db_path: str, warmup: str, path: str) -> dict:
+    """Import, lifespan startup and first request timings of one fresh worker"""
+    result = subprocess.run([sys.executable, "-c", _CHILD, path], env=_environment(db_path, warmup),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(db_path: str, top: int = 10) -> List[tuple]:
+    """Cumulative import time of the slowest modules ``main`` imports directly, from ``-X importtime``"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            env=_environment(db_path, ""), capture_output=True, text=True, check=True)
+    # Children are listed before their parent, indented two more spaces per level
+    modules, children = [], []
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == "main":
+                modules = children
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(modules, key=lambda module: -module[1])[:top]
+
+
+def run(db_path: str, runs: int = 5, warmup: str = "all", path: str = "/api/screener/gainers?limit=20") -> dict:
+    """Median timings of ``runs`` cold starts, lazy and with ``warmup`` datasets preloaded"""
+    result = {"runs": runs, "path": path, "modes": {}}
+    for mode, setting in (("lazy", ""), (f"warmup={warmup}", warmup)):
+        samples = [sample(db_path, setting, path) for _ in range(runs)]
+        result["modes"][mode] = {
+            key: round(statistics.median(s[key] for s in samples), 4)
+            for key in ("import_s", "startup_s", "first_request_s")
+        }
+        result["modes"][mode]["modules"] = samples[-1]["modules"]
+    result["imports"] = import_profile(db_path)
+    return result
+
+
+def print_report(result: dict, budget: float):
+    print(f"Median of {result['runs']} cold starts; first request: GET {result['path']}\n")
+    header = f"{'mode':<22} {'import ms':>9} {'startup ms':>10} {'first req ms':>12} {'ready ms':>9} {'modules':>7}"
+    print(header)
+    print("-" * len(header))
+    for mode, stats in result["modes"].items():
+        ready = stats["import_s"] + stats["startup_s"]
+        print(f"{mode:<22} {stats['import_s'] * 1000:>9.0f} {stats['startup_s'] * 1000:>10.0f} "
+              f"{stats['first_request_s'] * 1000:>12.1f} {ready * 1000:>9.0f} {stats['modules']:>7}")
+    print("\nSlowest imports of main (cumulative ms):")
+    for name, seconds in result["imports"]:
+        print(f"  {name:<28} {seconds * 1000:>7.1f}")
+    import_s = result["modes"]["lazy"]["import_s"]
+    verdict = "within" if import_s <= budget else "OVER"
+    print(f"\nimport main: {import_s * 1000:.0f}ms, {verdict} the {budget * 1000:.0f}ms budget")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time a cold worker: import, lifespan startup (lazy and warmed up) and first request")
+    parser.add_argument("--db", help="SQLite database to start against (default: a freshly seeded temporary one)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per mode")
+    parser.add_argument("--warmup", default="all", help="STARTUP_WARMUP value for the warmed-up mode")
+    parser.add_argument("--path", default="/api/screener/gainers?limit=20", help="First request after startup")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET,
+                        help="Seconds `import main` may take; exits 1 when exceeded")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(workdir, "startup.db")
+            print(f"Seeding {db_path}...")
+            seed(db_path)
+        result = run(db_path, args.runs, args.warmup, args.path)
+
+    print()
+    print_report(result, args.budget)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nReport written to {args.output}")
+    return 0 if result["modes"]["lazy"]["import_s"] <= args.budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
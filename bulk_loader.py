@@ -0,0 +1,119 @@
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Batches written concurrently by a bulk load
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", "4"))
+
+
+class BulkLoader:
+    """Stream rows into a table as concurrent upsert batches
+
+    - Up to ``max_workers`` batches are in flight at once; the input iterable
+      is only consumed as fast as batches are submitted.
+    - The batch size adapts so each round trip takes about ``target_seconds``:
+      fast batches double it, slow ones shrink it, and a failed batch halves
+      it, always within ``[min_batch_size, max_batch_size]``.
+    - A failed batch is retried ``retries`` times with exponential backoff and
+      jitter before its rows are counted as failed.
+    - Writes go through ``Repository.upsert_rows``, so reloading the same data
+      updates rows on the table's UNIQUE key instead of failing.
+    - A loaded table is recorded in the invalidations log, so running API
+      workers drop what they derived from it.
+    """
+
+    def __init__(self, backend=None, max_workers: int = BULK_MAX_WORKERS, batch_size: int = 500,
+                 min_batch_size: int = 50, max_batch_size: int = 5000, target_seconds: float = 0.5,
+                 retries: int = 3, backoff: float = 0.5):
+        if backend is None:
+            from repository import create_repository
+            backend = create_repository()
+        self.backend = backend
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_seconds = target_seconds
+        self.retries = retries
+        self.backoff = backoff
+
+    def load(self, table: str, rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Upsert every row into ``table``; returns a report with rows/second"""
+        start_time = time.perf_counter()
+        rows = iter(rows)
+        size = self.batch_size
+        report = {"table": table, "rows": 0, "failed": 0, "batches": 0, "retries": 0}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"bulk-{table}") as pool:
+            pending = set()
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.max_workers:
+                    batch = list(islice(rows, size))
+                    if not batch:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(self._write, table, batch))
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count, elapsed, retries, error = future.result()
+                    report["batches"] += 1
+                    report["retries"] += retries
+                    if error is None:
+                        report["rows"] += count
+                        size = self._resize(size, elapsed)
+                    else:
+                        report["failed"] += count
+                        size = max(self.min_batch_size, size // 2)
+                        print(f"❌ {table}: batch of {count} rows failed after {retries} retries: {error}")
+
+        if report["rows"]:
+            self._announce(table)
+        seconds = time.perf_counter() - start_time
+        report["seconds"] = round(seconds, 3)
+        report["rows_per_second"] = round(report["rows"] / seconds) if seconds > 0 else None
+        print(f"✅ {table}: {report['rows']} rows in {seconds:.2f}s "
+              f"({report['rows_per_second'] or 0:,} rows/s, {report['batches']} batches"
+              + (f", {report['failed']} failed" if report["failed"] else "") + ")")
+        return report
+
+    def load_all(self, tables: Iterable[Tuple[str, Iterable[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Load several tables in order (parents before children)"""
+        return [self.load(table, rows) for table, rows in tables]
+
+    def _announce(self, table: str):
+        from invalidation import ORIGIN
+        try:
+            self.backend.record_invalidation(ORIGIN, table)
+        except Exception as e:
+            print(f"⚠️  {table}: could not record the invalidation, API caches refresh on their TTL: {e}")
+
+    def _write(self, table: str, batch: List[Dict[str, Any]]) -> Tuple[int, float, int, Optional[Exception]]:
+        """Upsert one batch with retries; returns (rows, seconds of the last attempt, retries, error)"""
+        for attempt in range(self.retries + 1):
+            start_time = time.perf_counter()
+            try:
+                self.backend.upsert_rows(table, batch)
+                return len(batch), time.perf_counter() - start_time, attempt, None
+            except Exception as e:
+                if attempt == self.retries:
+                    return len(batch), time.perf_counter() - start_time, attempt, e
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def _resize(self, size: int, elapsed: float) -> int:
+        """Scale the batch size toward ``target_seconds`` per batch, at most 2x per step"""
+        if elapsed <= 0:
+            factor = 2.0
+        else:
+            factor = min(2.0, max(0.5, self.target_seconds / elapsed))
+        return int(min(self.max_batch_size, max(self.min_batch_size, size * factor)))
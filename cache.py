@@ -0,0 +1,223 @@
+import asyncio
+import inspect
+import os
+import random
+import sys
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Hashable, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from invalidation import bus
+
+load_dotenv()
+
+# Default time-to-live in seconds for the API's response caches; writes invalidate
+# them through the invalidation bus, so the TTL only bounds out-of-band changes
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+
+# Every cache registers itself here so stats and invalidation can reach it
+CACHES: Dict[str, "TTLCache"] = {}
+
+
+def approx_size(value: Any) -> int:
+    """Rough byte size of a cached payload (rows of scalars)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_size(item) for item in value)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until", "size")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float, size: int):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.size = size
+
+
+class TTLCache:
+    """Async read-through cache with per-entry TTL
+
+    - Each entry expires ``ttl`` seconds after it was loaded, +/- ``jitter`` so
+      keys loaded together do not all expire at the same instant.
+    - Concurrent misses for one key share a single load (single-flight).
+    - For ``stale_ttl`` seconds after expiry the old value is still served
+      while one background load refreshes it (stale-while-revalidate).
+    - Entries are evicted least recently used first once ``max_entries`` or
+      ``max_bytes`` (estimated with ``approx_size``) is exceeded.
+    """
+
+    def __init__(self, name: str, ttl: float, jitter: float = 0.1, stale_ttl: Optional[float] = None,
+                 max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.name = name
+        self.ttl = ttl
+        self.jitter = jitter
+        self.stale_ttl = ttl if stale_ttl is None else stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        # Bumped by invalidate() so loads started before it do not store stale results
+        self._generation = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.evictions = 0
+
+        CACHES[name] = self
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+
+        if entry is not None and now < entry.fresh_until:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            self._entries.move_to_end(key)
+            self._start_load(key, loader)
+            return entry.value
+
+        self.misses += 1
+        return await asyncio.shield(self._start_load(key, loader))
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            # Background refreshes may have no awaiter; mark their errors as retrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation
+        task = asyncio.current_task()
+        self.loads += 1
+        try:
+            value = await loader()
+        except Exception:
+            self.load_errors += 1
+            raise
+        else:
+            if generation == self._generation:
+                self.set(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def set(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        ttl = self.ttl * random.uniform(1 - self.jitter, 1 + self.jitter)
+        size = approx_size(value)
+
+        self._discard(key)
+        self._entries[key] = _Entry(value, now + ttl, now + ttl + self.stale_ttl, size)
+        self._bytes += size
+
+        if now - self._last_sweep > self.ttl:
+            self._sweep(now)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _sweep(self, now: float):
+        """Drop entries that are past their stale window"""
+        for key in [k for k, e in self._entries.items() if now >= e.stale_until]:
+            self._discard(key)
+        self._last_sweep = now
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or every entry when ``key`` is None"""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+            self._bytes = 0
+        else:
+            self._discard(key)
+            self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry (and in-flight load) whose key matches ``predicate``"""
+        self._generation += 1
+        for key in [key for key in self._entries if predicate(key)]:
+            self._discard(key)
+        for key in [key for key in self._inflight if predicate(key)]:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+        }
+
+
+def cached(name: str, ttl: float, invalidated_by: Sequence[str] = (), symbol_arg: Optional[str] = None, **options):
+    """Cache an async function's results in a named ``TTLCache`` keyed by its arguments
+
+    Writes to any ``invalidated_by`` table drop the cache; when parameter
+    ``symbol_arg`` names the symbol, only that symbol's entries go, however
+    the symbol was passed.
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        cache = TTLCache(name, ttl, **options)
+        signature = inspect.signature(func)
+        if symbol_arg is not None and symbol_arg not in signature.parameters:
+            raise ValueError(f"{func.__name__} has no parameter {symbol_arg!r}")
+
+        def symbol_of(key: Hashable) -> str:
+            args, kwargs = key
+            return str(signature.bind(*args, **dict(kwargs)).arguments[symbol_arg]).upper()
+
+        def on_write(table: str, symbols: Optional[FrozenSet[str]]):
+            if symbols is None or symbol_arg is None:
+                cache.invalidate()
+            else:
+                cache.invalidate_where(lambda key: symbol_of(key) in symbols)
+
+        bus.subscribe(invalidated_by, on_write)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return await cache.get_or_load(key, lambda: func(*args, **kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
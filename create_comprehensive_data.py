@@ -1,7 +1,10 @@
-from supabase_db import supabase_db
 from datetime import date, datetime, timedelta
 import random
 
+from bulk_loader import BulkLoader
+from indicators import indicator_rows
+from price_store import series_from_rows
+
 def create_comprehensive_data():
     print("Creating comprehensive 2-year financial data...")
     
@@ -202,58 +205,37 @@ def create_comprehensive_data():
         
         return fundamentals
     
-    # Generate technical indicators for last 90 days
-    def generate_technical_indicators():
-        indicators = []
-        
-        for stock in all_stocks[:20]:  # First 20 stocks to keep it manageable
-            symbol = stock["symbol"]
-            
-            for i in range(90):  # Last 90 days
-                date_obj = date.today() - timedelta(days=89-i)
-                
-                base_price = random.uniform(50, 300)
-                
-                indicators.append({
-                    "symbol": symbol,
-                    "date": date_obj.isoformat(),
-                    "sma_20": round(base_price * random.uniform(0.95, 1.05), 2),
-                    "sma_50": round(base_price * random.uniform(0.90, 1.10), 2),
-                    "sma_200": round(base_price * random.uniform(0.85, 1.15), 2),
-                    "rsi": round(random.uniform(25.0, 75.0), 2),
-                    "macd": round(random.uniform(-3.0, 3.0), 4),
-                    "bollinger_upper": round(base_price * 1.1, 2),
-                    "bollinger_lower": round(base_price * 0.9, 2)
-                })
-        
-        return indicators
+    # Compute technical indicators from the generated prices for every stock
+    def generate_technical_indicators(prices):
+        return indicator_rows(series_from_rows(prices))
     
     print("📊 Generating comprehensive data...")
     print(f"   • {len(all_stocks)} stocks across {len(sectors_data)} sectors")
     print("   • 2 years of daily price data")
     print("   • 8 quarters of fundamentals")
-    print("   • 90 days of technical indicators")
+    print("   • 2 years of technical indicators computed from prices")
+    
+    stock_prices = generate_2_year_prices()
     
     return {
         "stocks": all_stocks,
         "sectors": sectors_data,
-        "stock_prices": generate_2_year_prices(),
+        "stock_prices": stock_prices,
         "fundamentals": generate_fundamentals(),
-        "technical_indicators": generate_technical_indicators()
+        "technical_indicators": generate_technical_indicators(stock_prices)
     }
 
 def insert_comprehensive_data():
     print("🚀 Creating and inserting comprehensive 2-year financial data...")
     
     try:
-        # Clear existing data first
+        loader = BulkLoader()
+        
+        # Clear existing data first (children before parents)
         print("\n🧹 Clearing existing data...")
         try:
-            supabase_db.supabase.table('technical_indicators').delete().neq('id', 0).execute()
-            supabase_db.supabase.table('fundamentals').delete().neq('id', 0).execute()
-            supabase_db.supabase.table('stock_prices').delete().neq('id', 0).execute()
-            supabase_db.supabase.table('stocks').delete().neq('id', 0).execute()
-            supabase_db.supabase.table('sectors').delete().neq('id', 0).execute()
+            for table in ('technical_indicators', 'fundamentals', 'stock_prices', 'stocks', 'sectors'):
+                loader.backend.clear_table(table)
             print("✅ Existing data cleared")
         except Exception as e:
             print(f"⚠️  Error clearing data (might be empty): {e}")
@@ -261,77 +243,25 @@ def insert_comprehensive_data():
         # Generate new data
         data = create_comprehensive_data()
         
-        # Insert sectors
-        print(f"\n🏢 Inserting {len(data['sectors'])} sectors...")
-        for sector in data["sectors"]:
-            try:
-                result = supabase_db.insert_sector(sector)
-                print(f"✅ {sector['name']}")
-            except Exception as e:
-                print(f"❌ Error inserting {sector['name']}: {e}")
-        
-        # Insert stocks
-        print(f"\n📊 Inserting {len(data['stocks'])} stocks...")
-        for stock in data["stocks"]:
-            try:
-                result = supabase_db.insert_stock(stock)
-                print(f"✅ {stock['symbol']} - {stock['name']} ({stock['sector']})")
-            except Exception as e:
-                print(f"❌ Error inserting {stock['symbol']}: {e}")
-        
-        # Insert stock prices in batches
-        print(f"\n💹 Inserting {len(data['stock_prices'])} stock prices (2 years)...")
-        batch_size = 100
-        success_count = 0
-        
-        for i in range(0, len(data['stock_prices']), batch_size):
-            batch = data['stock_prices'][i:i+batch_size]
-            try:
-                result = supabase_db.supabase.table('stock_prices').insert(batch).execute()
-                success_count += len(batch)
-                if success_count % 1000 == 0:
-                    print(f"✅ Inserted {success_count} prices...")
-            except Exception as e:
-                print(f"❌ Error inserting price batch: {e}")
-        
-        print(f"✅ Inserted {success_count} stock prices")
-        
-        # Insert fundamentals in batches
-        print(f"\n📈 Inserting {len(data['fundamentals'])} fundamentals...")
-        batch_size = 50
-        success_count = 0
-        
-        for i in range(0, len(data['fundamentals']), batch_size):
-            batch = data['fundamentals'][i:i+batch_size]
-            try:
-                result = supabase_db.supabase.table('fundamentals').insert(batch).execute()
-                success_count += len(batch)
-            except Exception as e:
-                print(f"❌ Error inserting fundamentals batch: {e}")
-        
-        print(f"✅ Inserted {success_count} fundamental records")
-        
-        # Insert technical indicators in batches
-        print(f"\n📊 Inserting {len(data['technical_indicators'])} technical indicators...")
-        batch_size = 50
-        success_count = 0
-        
-        for i in range(0, len(data['technical_indicators']), batch_size):
-            batch = data['technical_indicators'][i:i+batch_size]
-            try:
-                result = supabase_db.supabase.table('technical_indicators').insert(batch).execute()
-                success_count += len(batch)
-            except Exception as e:
-                print(f"❌ Error inserting technical batch: {e}")
-        
-        print(f"✅ Inserted {success_count} technical indicators")
+        # Upsert every table in concurrent, adaptively sized batches
+        print("\n📦 Loading data...")
+        reports = loader.load_all([
+            ('sectors', data['sectors']),
+            ('stocks', data['stocks']),
+            ('stock_prices', data['stock_prices']),
+            ('fundamentals', data['fundamentals']),
+            ('technical_indicators', data['technical_indicators']),
+        ])
+        total_rows = sum(report['rows'] for report in reports)
+        total_seconds = sum(report['seconds'] for report in reports)
+        print(f"✅ Loaded {total_rows} rows in {total_seconds:.1f}s")
         
         print("\n🎉 COMPREHENSIVE DATA INSERTION COMPLETE!")
         print("\n📋 Final Summary:")
         print(f"   • {len(data['stocks'])} stocks across {len(data['sectors'])} sectors")
         print(f"   • {len(data['stock_prices'])} stock prices (2 years daily data)")
         print(f"   • {len(data['fundamentals'])} fundamental records (8 quarters)")
-        print(f"   • {len(data['technical_indicators'])} technical indicators (90 days)")
+        print(f"   • {len(data['technical_indicators'])} technical indicators (2 years)")
         
         print("\n🔗 Test your APIs:")
         print("   • http://localhost:8000/docs")
@@ -1,7 +1,8 @@
-from supabase_db import supabase_db
 from datetime import date, datetime, timedelta
 import random
 
+from bulk_loader import BulkLoader
+
 def create_dummy_data():
     print("Creating comprehensive dummy financial data...")
     
@@ -141,67 +142,15 @@ def insert_all_dummy_data():
         # Generate data
         data = create_dummy_data()
         
-        # Insert stocks
-        print("\n📊 Inserting stocks...")
-        for stock in data["stocks"]:
-            try:
-                result = supabase_db.insert_stock(stock)
-                print(f"✅ {stock['symbol']} - {stock['name']}")
-            except Exception as e:
-                if "duplicate key" in str(e).lower():
-                    print(f"⚠️  {stock['symbol']} already exists")
-                else:
-                    print(f"❌ Error inserting {stock['symbol']}: {e}")
-        
-        # Insert sectors
-        print("\n🏢 Inserting sectors...")
-        for sector in data["sectors"]:
-            try:
-                result = supabase_db.insert_sector(sector)
-                print(f"✅ {sector['name']}")
-            except Exception as e:
-                if "duplicate key" in str(e).lower():
-                    print(f"⚠️  {sector['name']} already exists")
-                else:
-                    print(f"❌ Error inserting {sector['name']}: {e}")
-        
-        # Insert stock prices
-        print(f"\n💹 Inserting {len(data['stock_prices'])} stock prices...")
-        success_count = 0
-        for price in data["stock_prices"]:
-            try:
-                result = supabase_db.insert_stock_price(price)
-                success_count += 1
-                if success_count % 50 == 0:
-                    print(f"✅ Inserted {success_count} prices...")
-            except Exception as e:
-                if "duplicate key" not in str(e).lower():
-                    print(f"❌ Error inserting price for {price['symbol']}: {e}")
-        
-        print(f"✅ Inserted {success_count} stock prices")
-        
-        # Insert fundamentals
-        print(f"\n📈 Inserting {len(data['fundamentals'])} fundamentals...")
-        for fundamental in data["fundamentals"]:
-            try:
-                result = supabase_db.supabase.table('fundamentals').insert(fundamental).execute()
-                print(f"✅ {fundamental['symbol']} fundamentals")
-            except Exception as e:
-                if "duplicate key" not in str(e).lower():
-                    print(f"❌ Error inserting fundamentals for {fundamental['symbol']}: {e}")
-        
-        # Insert technical indicators
-        print(f"\n📊 Inserting {len(data['technical_indicators'])} technical indicators...")
-        success_count = 0
-        for indicator in data["technical_indicators"]:
-            try:
-                result = supabase_db.supabase.table('technical_indicators').insert(indicator).execute()
-                success_count += 1
-            except Exception as e:
-                if "duplicate key" not in str(e).lower():
-                    print(f"❌ Error inserting indicator for {indicator['symbol']}: {e}")
-        
-        print(f"✅ Inserted {success_count} technical indicators")
+        # Upsert every table in concurrent, adaptively sized batches
+        print("\n📦 Loading data...")
+        BulkLoader().load_all([
+            ('stocks', data['stocks']),
+            ('sectors', data['sectors']),
+            ('stock_prices', data['stock_prices']),
+            ('fundamentals', data['fundamentals']),
+            ('technical_indicators', data['technical_indicators']),
+        ])
         
         print("\n🎉 DUMMY DATA INSERTION COMPLETE!")
         print("\n📋 Summary:")
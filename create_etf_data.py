@@ -1,7 +1,8 @@
-from supabase_db import supabase_db
 from datetime import date, datetime, timedelta
 import random
 
+from bulk_loader import BulkLoader
+
 def create_etf_schema():
     """Create ETF table in Supabase"""
     sql_schema = """
@@ -38,6 +39,17 @@ def create_etf_schema():
     -- Create indexes
     CREATE INDEX IF NOT EXISTS idx_etf_prices_symbol_date ON etf_prices(symbol, date);
     CREATE INDEX IF NOT EXISTS idx_etfs_category ON etfs(category);
+
+    -- Keep latest_snapshots current for ETFs (refresh_latest_snapshot comes with the stock schema)
+    DROP TRIGGER IF EXISTS etf_prices_snapshot ON etf_prices;
+    CREATE TRIGGER etf_prices_snapshot AFTER INSERT OR UPDATE OR DELETE ON etf_prices
+        FOR EACH ROW EXECUTE FUNCTION refresh_latest_snapshot();
+    INSERT INTO latest_snapshots (kind, symbol, latest_price, previous_close)
+    SELECT 'etf', p.symbol, to_jsonb(p),
+           (SELECT close_price FROM etf_prices q WHERE q.symbol = p.symbol ORDER BY date DESC LIMIT 1 OFFSET 1)
+    FROM (SELECT DISTINCT ON (symbol) * FROM etf_prices ORDER BY symbol, date DESC) p
+    ON CONFLICT (kind, symbol) DO UPDATE
+        SET latest_price = EXCLUDED.latest_price, previous_close = EXCLUDED.previous_close;
     """
     
     print("Copy and paste this SQL into Supabase SQL Editor:")
@@ -189,6 +201,22 @@ def create_comprehensive_etf_data():
         "etf_prices": generate_etf_prices()
     }
 
+def etf_rows(etfs):
+    """ETF records shaped as rows of the etfs table"""
+    return [
+        {
+            "symbol": etf["symbol"],
+            "name": etf["name"],
+            "category": etf["category"],
+            "expense_ratio": etf["expense_ratio"],
+            "aum": etf["aum"],
+            "inception_date": etf["inception_date"],
+            "benchmark": etf["benchmark"],
+            "leverage_ratio": etf["leverage"]
+        }
+        for etf in etfs
+    ]
+
 def insert_etf_data():
     print("🚀 Creating and inserting comprehensive ETF data...")
     
@@ -203,43 +231,13 @@ def insert_etf_data():
         # Generate ETF data
         data = create_comprehensive_etf_data()
         
-        # Insert ETFs
-        print(f"\n📊 Inserting {len(data['etfs'])} ETFs...")
-        for etf in data["etfs"]:
-            try:
-                result = supabase_db.supabase.table('etfs').insert({
-                    "symbol": etf["symbol"],
-                    "name": etf["name"],
-                    "category": etf["category"],
-                    "expense_ratio": etf["expense_ratio"],
-                    "aum": etf["aum"],
-                    "inception_date": etf["inception_date"],
-                    "benchmark": etf["benchmark"],
-                    "leverage_ratio": etf["leverage"]
-                }).execute()
-                print(f"✅ {etf['symbol']} - {etf['name']} ({etf['category']})")
-            except Exception as e:
-                if "duplicate key" in str(e).lower():
-                    print(f"⚠️  {etf['symbol']} already exists")
-                else:
-                    print(f"❌ Error inserting {etf['symbol']}: {e}")
-        
-        # Insert ETF prices in batches
-        print(f"\n💹 Inserting {len(data['etf_prices'])} ETF prices (2 years)...")
-        batch_size = 100
-        success_count = 0
-        
-        for i in range(0, len(data['etf_prices']), batch_size):
-            batch = data['etf_prices'][i:i+batch_size]
-            try:
-                result = supabase_db.supabase.table('etf_prices').insert(batch).execute()
-                success_count += len(batch)
-                if success_count % 1000 == 0:
-                    print(f"✅ Inserted {success_count} ETF prices...")
-            except Exception as e:
-                print(f"❌ Error inserting ETF price batch: {e}")
-        
-        print(f"✅ Inserted {success_count} ETF prices")
+        # Upsert ETFs, then their prices, in concurrent batches
+        etfs = etf_rows(data["etfs"])
+        print(f"\n📦 Loading {len(etfs)} ETFs and {len(data['etf_prices'])} ETF prices (2 years)...")
+        BulkLoader().load_all([
+            ('etfs', etfs),
+            ('etf_prices', data['etf_prices']),
+        ])
         
         print("\n🎉 ETF DATA INSERTION COMPLETE!")
         print("\n📋 ETF Summary:")
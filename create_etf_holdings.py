@@ -1,6 +1,7 @@
-from supabase_db import supabase_db
 import random
 
+from bulk_loader import BulkLoader
+
 def create_etf_holdings_schema():
     """Create ETF holdings table schema"""
     sql_schema = """
@@ -30,13 +31,12 @@ def create_etf_holdings_schema():
     print("=" * 60)
     return sql_schema
 
-def create_etf_holdings_data():
+def create_etf_holdings_data(backend):
     """Create realistic ETF holdings based on actual ETF compositions"""
     
     # Get all available stocks from database
     try:
-        stocks_result = supabase_db.supabase.table('stocks').select('symbol, sector, market_cap').execute()
-        available_stocks = stocks_result.data
+        available_stocks = backend.get_stocks('symbol, sector, market_cap')
         print(f"Found {len(available_stocks)} stocks to use in ETF compositions")
     except Exception as e:
         print(f"Error fetching stocks: {e}")
@@ -207,28 +207,16 @@ def insert_etf_holdings():
         input()
         
         # Generate holdings data
-        holdings_data = create_etf_holdings_data()
+        loader = BulkLoader()
+        holdings_data = create_etf_holdings_data(loader.backend)
         
         if not holdings_data:
             print("❌ No holdings data generated")
             return
         
-        # Insert holdings in batches
+        # Upsert holdings in concurrent batches
         print(f"\n📊 Inserting {len(holdings_data)} ETF holdings...")
-        batch_size = 50
-        success_count = 0
-        
-        for i in range(0, len(holdings_data), batch_size):
-            batch = holdings_data[i:i+batch_size]
-            try:
-                result = supabase_db.supabase.table('etf_holdings').insert(batch).execute()
-                success_count += len(batch)
-                if success_count % 100 == 0:
-                    print(f"✅ Inserted {success_count} holdings...")
-            except Exception as e:
-                print(f"❌ Error inserting holdings batch: {e}")
-        
-        print(f"✅ Inserted {success_count} ETF holdings")
+        loader.load('etf_holdings', holdings_data)
         
         # Show summary by ETF
         print("\n📋 Holdings Summary by ETF:")
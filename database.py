@@ -1,13 +1,160 @@
 import sqlite3
 import os
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+
+# PRAGMA sets applied to every pooled connection. journal_mode is persistent and
+# only set on the writer; the rest are per-connection.
+PRAGMA_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,        # KiB (negative) -> 64 MB page cache
+        "mmap_size": 268435456,      # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "read_heavy": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256000,
+        "mmap_size": 1073741824,     # 1 GB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -64000,
+        "mmap_size": 0,
+        "busy_timeout": 10000,
+    },
+    "bulk_load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -512000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+}
+
+# Tables whose newest row is materialized into latest_snapshots by triggers:
+# table -> (snapshot kind, ORDER BY picking the newest row, snapshot column for that row)
+SNAPSHOT_SOURCES = {
+    "stock_prices": ("stock", "date DESC", "latest_price"),
+    "etf_prices": ("etf", "date DESC", "latest_price"),
+    "fundamentals": ("stock", "year DESC, quarter DESC", "fundamentals"),
+    "technical_indicators": ("stock", "date DESC", "technical_indicators"),
+}
+
+
+def _snapshot_assignments(table: str, columns: List[str], order_by: str, column: str, symbol: str) -> str:
+    """SET clause recomputing ``table``'s snapshot column(s) for the symbol expression ``symbol``"""
+    newest = f"FROM {table} WHERE symbol = {symbol} ORDER BY {order_by}"
+    fields = ", ".join(f"'{name}', {name}" for name in columns)
+    assignments = f"{column} = (SELECT json_object({fields}) {newest} LIMIT 1)"
+    if column == "latest_price":
+        assignments += f", previous_close = (SELECT close_price {newest} LIMIT 1 OFFSET 1)"
+    return assignments
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: a pool of readers and one serialized writer
+
+    With WAL enabled readers never block on the writer, so queries check out any
+    idle read connection while all writes go through a single connection behind
+    a lock. Connections stay open for the life of the pool, which keeps their
+    prepared statement caches warm.
+    """
+
+    def __init__(self, db_path: str, pragmas: Dict[str, Any], max_readers: int = 8,
+                 cached_statements: int = 256):
+        self.db_path = db_path
+        self.pragmas = pragmas
+        self.max_readers = max_readers
+        self.cached_statements = cached_statements
+
+        self._write_lock = threading.Lock()
+        self._writer = self._connect(writer=True)
+        # An in-memory database only exists on the connection that created it
+        self._shared = db_path == ":memory:"
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def _connect(self, writer: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            if name == "journal_mode" and not writer:
+                continue
+            conn.execute(f"PRAGMA {name} = {value}")
+        if not writer:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Check out a read-only connection"""
+        if self._shared:
+            with self._write_lock:
+                yield self._writer
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._readers_lock:
+                if len(self._readers) < self.max_readers:
+                    conn = self._connect(writer=False)
+                    self._readers.append(conn)
+            if conn is None:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Hold the single writer connection for one transaction"""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+
 
 class Database:
-    def __init__(self, db_path: str = "finstocks.db"):
+    def __init__(self, db_path: str = "finstocks.db", profile: str = "default",
+                 max_readers: int = 8, cached_statements: int = 256):
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown PRAGMA profile '{profile}', expected one of {sorted(PRAGMA_PROFILES)}")
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, PRAGMA_PROFILES[profile], max_readers, cached_statements)
         self.init_db()
     
     def get_connection(self):
+        """Open a standalone connection (outside the pool)"""
         return sqlite3.connect(self.db_path)
     
     def init_db(self):
@@ -87,35 +234,154 @@ class Database:
             UNIQUE(symbol, date)
         );
 
+        -- ETFs
+        CREATE TABLE IF NOT EXISTS etfs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol VARCHAR(10) UNIQUE NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            expense_ratio DECIMAL(4,3),
+            aum DECIMAL(15,2),
+            inception_date DATE,
+            benchmark VARCHAR(255),
+            leverage_ratio DECIMAL(3,1) DEFAULT 1.0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+
+        -- ETF prices (historical and current)
+        CREATE TABLE IF NOT EXISTS etf_prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            open_price DECIMAL(10,4),
+            high_price DECIMAL(10,4),
+            low_price DECIMAL(10,4),
+            close_price DECIMAL(10,4),
+            volume BIGINT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (symbol) REFERENCES etfs(symbol),
+            UNIQUE(symbol, date)
+        );
+
+        -- ETF holdings with stock weights
+        CREATE TABLE IF NOT EXISTS etf_holdings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            etf_symbol VARCHAR(10) NOT NULL,
+            stock_symbol VARCHAR(10) NOT NULL,
+            weight_percentage DECIMAL(5,3) NOT NULL,
+            shares_held BIGINT,
+            market_value DECIMAL(15,2),
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (etf_symbol) REFERENCES etfs(symbol),
+            FOREIGN KEY (stock_symbol) REFERENCES stocks(symbol),
+            UNIQUE(etf_symbol, stock_symbol)
+        );
+
         -- Indexes for performance
         CREATE INDEX IF NOT EXISTS idx_stock_prices_symbol_date ON stock_prices(symbol, date);
         CREATE INDEX IF NOT EXISTS idx_fundamentals_symbol ON fundamentals(symbol);
         CREATE INDEX IF NOT EXISTS idx_technical_symbol_date ON technical_indicators(symbol, date);
+        CREATE INDEX IF NOT EXISTS idx_etf_prices_symbol_date ON etf_prices(symbol, date);
+        CREATE INDEX IF NOT EXISTS idx_etfs_category ON etfs(category);
+        CREATE INDEX IF NOT EXISTS idx_etf_holdings_etf_symbol ON etf_holdings(etf_symbol);
+        CREATE INDEX IF NOT EXISTS idx_etf_holdings_stock_symbol ON etf_holdings(stock_symbol);
+
+        -- Writes announced to every process serving this database (see invalidation.py)
+        CREATE TABLE IF NOT EXISTS invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            symbols TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        -- Newest price bar, previous close, fundamentals and technicals per symbol,
+        -- kept current by triggers so detail reads are one primary key lookup
+        CREATE TABLE IF NOT EXISTS latest_snapshots (
+            kind VARCHAR(10) NOT NULL,
+            symbol VARCHAR(10) NOT NULL,
+            latest_price TEXT,
+            previous_close DECIMAL(10,4),
+            fundamentals TEXT,
+            technical_indicators TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, symbol)
+        );
         """
         
-        with self.get_connection() as conn:
+        with self.pool.writer() as conn:
             conn.executescript(schema)
+            # DDL outside a transaction autocommits; workers starting together take turns instead
+            conn.execute("BEGIN IMMEDIATE")
+            self._init_snapshots(conn)
+
+    def _init_snapshots(self, conn: sqlite3.Connection):
+        """(Re)create the triggers maintaining latest_snapshots, and backfill the table when it is new"""
+        backfill = conn.execute("SELECT 1 FROM latest_snapshots LIMIT 1").fetchone() is None
+        for table, (kind, order_by, column) in SNAPSHOT_SOURCES.items():
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+            for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                # No OR IGNORE in the body: an upsert's conflict handling overrides it and the
+                # snapshot insert would abort the write, so skip existing rows explicitly
+                conn.execute(f"DROP TRIGGER IF EXISTS {table}_snapshot_{event.lower()}")
+                conn.execute(f"""
+                    CREATE TRIGGER {table}_snapshot_{event.lower()} AFTER {event} ON {table}
+                    BEGIN
+                        INSERT INTO latest_snapshots (kind, symbol)
+                        SELECT '{kind}', {row}.symbol
+                        WHERE NOT EXISTS (SELECT 1 FROM latest_snapshots WHERE kind = '{kind}' AND symbol = {row}.symbol);
+                        UPDATE latest_snapshots
+                        SET {_snapshot_assignments(table, columns, order_by, column, f"{row}.symbol")},
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE kind = '{kind}' AND symbol = {row}.symbol;
+                    END
+                """)
+            if backfill:
+                conn.execute(f"INSERT OR IGNORE INTO latest_snapshots (kind, symbol) SELECT DISTINCT '{kind}', symbol FROM {table}")
+                conn.execute(
+                    f"UPDATE latest_snapshots SET {_snapshot_assignments(table, columns, order_by, column, 'latest_snapshots.symbol')} WHERE kind = ?",
+                    (kind,)
+                )
     
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """Execute SELECT query and return results as list of dicts"""
-        with self.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
+        with self.pool.reader() as conn:
             cursor = conn.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
     
     def execute_insert(self, query: str, params: tuple = ()) -> int:
         """Execute INSERT query and return last row id"""
-        with self.get_connection() as conn:
+        with self.pool.writer() as conn:
             cursor = conn.execute(query, params)
-            conn.commit()
             return cursor.lastrowid
     
+    def execute_many(self, query: str, seq_of_params: List[tuple]) -> int:
+        """Execute a statement for every parameter tuple in one transaction"""
+        with self.pool.writer() as conn:
+            conn.executemany(query, seq_of_params)
+            return len(seq_of_params)
+    
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """Execute UPDATE/DELETE query and return affected rows"""
-        with self.get_connection() as conn:
+        with self.pool.writer() as conn:
             cursor = conn.execute(query, params)
-            conn.commit()
             return cursor.rowcount
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close()
+
+# Global database instance, opened on first access of ``database.db`` rather than at import
+_db: Optional[Database] = None
+_db_lock = threading.Lock()
 
-# Global database instance
-db = Database()
+def __getattr__(name: str):
+    global _db
+    if name != "db":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _db_lock:
+        if _db is None:
+            _db = Database()
+    return _db
@@ -1,91 +1,124 @@
-from functools import lru_cache
-import time
-from fastapi import HTTPException
-from supabase_db import supabase_db
+import asyncio
+from fastapi import HTTPException, Request
+from repository import repository, with_timeout
+from cache import CACHE_TTL, cached
+from price_store import etf_price_store
+from holdings import holdings_index, parse_conditions
+from streaming import price_history_response
+from versions import versions
+from invalidation import bus
 
 # ETF CRUD operations
-def get_etf(symbol: str):
+async def get_etf(symbol: str):
     """Get ETF details"""
     try:
         symbol = symbol.upper()
-        
-        # Get basic ETF info
-        etf_result = supabase_db.supabase.table('etfs').select('*').eq('symbol', symbol).execute()
-        if not etf_result.data:
+
+        # ETF row and its latest snapshot are fetched concurrently
+        etf, snapshot = await asyncio.gather(
+            repository.get_etf(symbol),
+            with_timeout(repository.get_snapshot('etf', symbol))
+        )
+        if not etf:
             raise HTTPException(status_code=404, detail="ETF not found")
-        
-        etf = etf_result.data[0]
-        
-        # Get latest price
-        price_result = supabase_db.supabase.table('etf_prices').select('*').eq('symbol', symbol).order('date', desc=True).limit(1).execute()
-        latest_price = price_result.data[0] if price_result.data else None
-        
+
+        snapshot = snapshot or {}
+
         return {
             **etf,
-            "latest_price": latest_price
+            "latest_price": snapshot.get("latest_price"),
+            "previous_close": snapshot.get("previous_close")
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@lru_cache(maxsize=100)
-def get_cached_etf_prices(symbol: str, days: int, cache_key: str):
+@cached("etf_prices", ttl=CACHE_TTL, max_entries=100, invalidated_by=("etf_prices",), symbol_arg="symbol")
+async def get_cached_etf_prices(symbol: str, days: int):
     """Cached ETF price data"""
-    start_time = time.time()
-    
-    symbol = symbol.upper()
-    result = supabase_db.supabase.table('etf_prices').select('*').eq('symbol', symbol).order('date', desc=True).limit(days).execute()
-    
-    end_time = time.time()
-    query_time = (end_time - start_time) * 1000
-    print(f"💹 Supabase ETF prices query for {symbol} took: {query_time:.2f}ms")
-    
-    return result.data
+    return await repository.get_etf_prices(symbol, days)
+
+async def get_etf_prices(symbol: str, request: Request, days: int = 30, format: str = "json", interval: str = "1d"):
+    """Get ETF price history - served from the price store, cached query as fallback"""
+    try:
+        return await price_history_response(request, etf_price_store, symbol, days, format, get_cached_etf_prices,
+                                            interval)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-def get_etf_prices(symbol: str, days: int = 30):
-    """Get ETF price history - now cached"""
+async def upsert_etf_prices(prices):
+    """Add or update ETF price bars"""
     try:
-        # Cache for 30 seconds
-        cache_key = str(int(time.time() // 30))
-        return get_cached_etf_prices(symbol, days, cache_key)
+        rows = [
+            {**price.model_dump(mode="json", exclude={"id", "created_at"}), "symbol": price.symbol.upper()}
+            for price in prices
+        ]
+        written = await repository.upsert_etf_prices(rows)
+        await etf_price_store.append(rows)
+        await bus.publish("etf_prices", [row["symbol"] for row in rows])
+        return {"written": written}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@lru_cache(maxsize=10)
-def get_cached_etfs_data(cache_key: str):
+@cached("etfs", ttl=CACHE_TTL, max_entries=10, invalidated_by=("etfs",))
+async def get_cached_etfs_data():
     """Cached ETFs data"""
-    start_time = time.time()
-    
-    result = supabase_db.supabase.table('etfs').select('*').order('aum', desc=True).execute()
-    
-    end_time = time.time()
-    query_time = (end_time - start_time) * 1000
-    print(f"💰 Supabase ETFs query took: {query_time:.2f}ms")
-    
-    return result.data
+    result = await repository.get_etfs()
+    versions.observe("etfs", None, result)
+    return result
 
-def get_all_etfs():
+async def get_all_etfs():
     """Get all ETFs - now cached"""
     try:
-        # Cache for 30 seconds
-        cache_key = str(int(time.time() // 30))
-        return get_cached_etfs_data(cache_key)
+        return await get_cached_etfs_data()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_etfs_by_category(category: str):
+async def get_etfs_by_category(category: str):
     """Get ETFs by category"""
     try:
-        result = supabase_db.supabase.table('etfs').select('*').eq('category', category).order('aum', desc=True).execute()
-        return result.data
+        return await repository.get_etfs_by_category(category)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def get_leveraged_etfs():
+async def get_leveraged_etfs():
     """Get leveraged ETFs (leverage > 1)"""
     try:
-        result = supabase_db.supabase.table('etfs').select('*').gt('leverage_ratio', 1.0).order('aum', desc=True).execute()
-        return result.data
+        return await repository.get_leveraged_etfs()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_etf_holdings_response(request: Request, symbol: str, limit: int, stock_fields: tuple):
+    """ETF holdings with embedded stock fields from the holdings index, answered with a 304 when unchanged"""
+    try:
+        symbol = symbol.upper()
+        if not await holdings_index.ensure_loaded():
+            return await repository.get_etf_holdings(symbol, limit, stock_fields=stock_fields)
+        return versions.conditional(request, holdings_index.etf_holdings(symbol, limit, stock_fields),
+                                    "etf_holdings", symbol)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_stock_etfs(symbol: str):
+    """ETFs holding a stock, heaviest first - from the holdings index, query as fallback"""
+    try:
+        if not await holdings_index.ensure_loaded():
+            return await repository.get_stock_etfs(symbol.upper())
+        return holdings_index.stock_etfs(symbol)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_etfs_holding(stocks: str, limit: int = 50):
+    """ETFs holding every listed stock at or above its minimum weight (``NVDA:5,MSFT:3``)"""
+    conditions = parse_conditions(stocks)
+    try:
+        if not await holdings_index.ensure_loaded():
+            raise HTTPException(status_code=503, detail="ETF holdings are unavailable")
+        return holdings_index.etfs_holding(conditions, limit)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
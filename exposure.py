@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from holdings import HoldingsIndex, holdings_index
+
+UNKNOWN_SECTOR = "Unknown"
+
+# Overlap results kept per holdings version
+MAX_CACHED_OVERLAPS = 256
+
+
+class HoldingsMatrix:
+    """Sparse ETF × stock weight matrix in coordinate form
+
+    ``weights[k]`` is the fraction of ETF ``etfs[rows[k]]`` held in stock
+    ``stocks[columns[k]]``. Multiplying by a position vector is a single
+    ``bincount`` over the non-zeros, so its cost is O(holdings) however many
+    ETFs and stocks there are.
+    """
+
+    def __init__(self, holdings: Iterable[Dict[str, Any]]):
+        etf_index: Dict[str, int] = {}
+        stock_index: Dict[str, int] = {}
+        rows, columns, weights = [], [], []
+        for holding in holdings:
+            weight = holding.get("weight_percentage")
+            if not weight:
+                continue
+            rows.append(etf_index.setdefault(holding["etf_symbol"].upper(), len(etf_index)))
+            columns.append(stock_index.setdefault(holding["stock_symbol"].upper(), len(stock_index)))
+            weights.append(float(weight) / 100)
+
+        self.etf_index = etf_index
+        self.stocks = list(stock_index)
+        self.rows = np.array(rows, dtype=np.int32)
+        self.columns = np.array(columns, dtype=np.int32)
+        self.weights = np.array(weights, dtype=np.float64)
+        # Share of each ETF covered by its listed holdings (the rest is cash, bonds, unlisted names)
+        self.coverage = np.bincount(self.rows, weights=self.weights, minlength=len(etf_index))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.etf_index), len(self.stocks)
+
+    def position_vector(self, positions: Dict[str, float]) -> np.ndarray:
+        vector = np.zeros(len(self.etf_index), dtype=np.float64)
+        for symbol, value in positions.items():
+            vector[self.etf_index[symbol]] += value
+        return vector
+
+    def exposure(self, vector: np.ndarray) -> np.ndarray:
+        """Value held in each stock (``Wᵀ · vector``)"""
+        return np.bincount(self.columns, weights=self.weights * vector[self.rows], minlength=len(self.stocks))
+
+    def pair_products(self, etf_rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``W · Wᵀ``, summed minimum weight and common holding count between the ETFs ``etf_rows``
+
+        One pass over the pairs of non-zeros that share a stock column, which is
+        the sparse product restricted to the selected rows: the cost follows the
+        overlap between the ETFs, not ETFs × stocks.
+        """
+        k = len(etf_rows)
+        position = np.full(len(self.etf_index), -1, dtype=np.int64)
+        position[etf_rows] = np.arange(k)
+        selected = position[self.rows] >= 0
+        rows, columns, weights = position[self.rows[selected]], self.columns[selected], self.weights[selected]
+        order = np.argsort(columns, kind="stable")
+        rows, columns, weights = rows[order], columns[order], weights[order]
+
+        # Entries are grouped by stock; pair every entry with each entry of its group (itself included)
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        sizes = np.diff(np.r_[starts, len(columns)])
+        group_sizes = np.repeat(sizes, sizes)
+        left = np.repeat(np.arange(len(columns)), group_sizes)
+        right = (np.repeat(np.repeat(starts, sizes), group_sizes)
+                 + np.arange(len(left)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes))
+
+        cells = rows[left] * k + rows[right]
+        dot = np.bincount(cells, weights=weights[left] * weights[right], minlength=k * k).reshape(k, k)
+        overlap = np.bincount(cells, weights=np.minimum(weights[left], weights[right]), minlength=k * k).reshape(k, k)
+        common = np.bincount(cells, minlength=k * k).reshape(k, k)
+        return dot, overlap, common
+
+
+class ExposureEngine:
+    """Look-through stock and sector exposure of a portfolio of ETF positions
+
+    Built from the holdings index. The matrix is rebuilt only when the index
+    reports a new etf_holdings version; stock sectors are re-mapped whenever
+    the index reloads, which is cheap.
+    """
+
+    def __init__(self, index: HoldingsIndex):
+        self.index = index
+        self.matrix: Optional[HoldingsMatrix] = None
+        self.sectors: List[str] = []
+        self.stock_sectors = np.empty(0, dtype=np.int32)
+        self.version: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        # Overlap results by requested symbols, valid until the holdings change
+        self._overlaps: "OrderedDict[Tuple[str, ...], Dict[str, Any]]" = OrderedDict()
+
+    async def ensure_loaded(self) -> bool:
+        """Rebuild the matrix when the holdings index changed; False if holdings are unavailable"""
+        if not await self.index.ensure_loaded():
+            return False
+        if self.version != self.index.version:
+            self.matrix = HoldingsMatrix(self.index.rows)
+            self._overlaps.clear()
+            self.version = self.index.version
+            self.loaded_at = None
+        if self.loaded_at != self.index.loaded_at:
+            self._map_sectors()
+            self.loaded_at = self.index.loaded_at
+        return True
+
+    def _map_sectors(self):
+        sector_index: Dict[str, int] = {}
+        self.stock_sectors = np.array(
+            [sector_index.setdefault(self.index.stocks.get(symbol, {}).get("sector") or UNKNOWN_SECTOR,
+                                     len(sector_index))
+             for symbol in self.matrix.stocks],
+            dtype=np.int32,
+        )
+        self.sectors = list(sector_index)
+
+    def exposure(self, positions: Iterable[Tuple[str, float]], limit: Optional[int] = 50) -> Dict[str, Any]:
+        """Per-stock and per-sector exposure of ``(etf_symbol, value)`` positions"""
+        matrix = self.matrix
+        known: Dict[str, float] = {}
+        unknown: Dict[str, float] = {}
+        for symbol, value in positions:
+            symbol = symbol.upper()
+            target = known if symbol in matrix.etf_index else unknown
+            target[symbol] = target.get(symbol, 0.0) + float(value)
+
+        total = sum(known.values()) + sum(unknown.values())
+        vector = matrix.position_vector(known)
+        by_stock = matrix.exposure(vector)
+        by_sector = np.bincount(self.stock_sectors, weights=by_stock, minlength=len(self.sectors))
+        allocated = float(by_stock.sum())
+
+        order = np.argsort(-by_stock, kind="stable")
+        order = order[by_stock[order] > 0]
+        if limit is not None:
+            order = order[:limit]
+        stocks = []
+        for index in order.tolist():
+            symbol = matrix.stocks[index]
+            info = self.index.stocks.get(symbol, {})
+            value = float(by_stock[index])
+            stocks.append({
+                "symbol": symbol,
+                "name": info.get("name"),
+                "sector": info.get("sector"),
+                "value": round(value, 2),
+                "weight_percentage": round(value / total * 100, 4) if total else 0.0,
+            })
+
+        sectors = [
+            {
+                "sector": self.sectors[index],
+                "value": round(float(by_sector[index]), 2),
+                "weight_percentage": round(float(by_sector[index]) / total * 100, 4) if total else 0.0,
+            }
+            for index in np.argsort(-by_sector, kind="stable").tolist() if by_sector[index] > 0
+        ]
+
+        return {
+            "total_value": round(total, 2),
+            "allocated_value": round(allocated, 2),
+            # ETF value outside the listed holdings, plus positions in ETFs with no holdings on file
+            "unallocated_value": round(total - allocated, 2),
+            "unknown_symbols": sorted(unknown),
+            "stocks": stocks,
+            "sectors": sectors,
+        }
+
+    def overlap(self, symbols: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Pairwise weight overlap, cosine similarity and common holdings of ``symbols`` (default: every ETF)"""
+        matrix = self.matrix
+        requested = tuple(symbol.upper() for symbol in symbols) if symbols is not None else tuple(matrix.etf_index)
+        cached = self._overlaps.get(requested)
+        if cached is not None:
+            self._overlaps.move_to_end(requested)
+            return cached
+
+        known = [symbol for symbol in requested if symbol in matrix.etf_index]
+        dot, overlap, common = matrix.pair_products(np.array([matrix.etf_index[symbol] for symbol in known],
+                                                             dtype=np.int64))
+        norms = np.sqrt(np.diag(dot))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosine = np.where(np.outer(norms, norms) > 0, dot / np.outer(norms, norms), 0.0)
+
+        overlap = np.round(overlap * 100, 4).tolist()
+        cosine = np.round(cosine, 6).tolist()
+        common = common.tolist()
+        result = {
+            "symbols": known,
+            "unknown_symbols": [symbol for symbol in requested if symbol not in matrix.etf_index],
+            # Sum over shared stocks of the smaller of the two weights, in percent
+            "overlap_percentage": {a: dict(zip(known, row)) for a, row in zip(known, overlap)},
+            "cosine_similarity": {a: dict(zip(known, row)) for a, row in zip(known, cosine)},
+            "common_holdings": {a: dict(zip(known, row)) for a, row in zip(known, common)},
+        }
+        self._overlaps[requested] = result
+        if len(self._overlaps) > MAX_CACHED_OVERLAPS:
+            self._overlaps.popitem(last=False)
+        return result
+
+
+# Global instance
+exposure_engine = ExposureEngine(holdings_index)
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_right
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+import metrics
+from invalidation import bus
+from repository import repository
+from versions import versions
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the index re-reads etf_holdings to pick up out-of-process writes
+HOLDINGS_REFRESH = float(os.getenv("HOLDINGS_REFRESH", "900"))
+
+# Most conditions accepted by one holdings query
+MAX_HOLDING_CONDITIONS = 20
+
+
+def parse_conditions(stocks: str) -> List[Tuple[str, float]]:
+    """Parse ``NVDA:5,MSFT:3`` into (symbol, minimum weight percentage) pairs; a bare symbol means any weight"""
+    conditions: Dict[str, float] = {}
+    for part in stocks.split(","):
+        symbol, _, weight = part.strip().partition(":")
+        symbol = symbol.strip().upper()
+        if not symbol:
+            continue
+        try:
+            conditions[symbol] = float(weight) if weight.strip() else 0.0
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid minimum weight for {symbol}: {weight!r}")
+    if not conditions:
+        raise HTTPException(status_code=400, detail="stocks must list at least one symbol")
+    if len(conditions) > MAX_HOLDING_CONDITIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_HOLDING_CONDITIONS} stocks per query")
+    return list(conditions.items())
+
+
+# Joined fields the holdings endpoints can embed, part of the etf_holdings version
+STOCK_EMBED_FIELDS = ("name", "sector", "market_cap")
+ETF_EMBED_FIELDS = ("name", "category")
+
+
+def _embedded(info: Optional[Dict[str, Any]], fields: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """``fields`` of a joined row, or None when it is missing (as PostgREST embeds it)"""
+    if info is None:
+        return None
+    embedded = {field: info.get(field) for field in fields}
+    return embedded if any(value is not None for value in embedded.values()) else None
+
+
+class HoldingsIndex:
+    """Bidirectional in-memory index over etf_holdings
+
+    ``by_etf`` maps an ETF to its holdings and ``by_stock`` maps a stock to the
+    ETFs holding it (its posting list), both heaviest first, so listing either
+    side is a slice. "ETFs holding at least w% of S" is a prefix of S's posting
+    list found by bisection; queries over several stocks intersect those
+    prefixes, smallest first.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]],
+                                                              List[Dict[str, Any]]]]],
+                 refresh_interval: float = HOLDINGS_REFRESH):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+
+        self.rows: List[Dict[str, Any]] = []
+        self.by_etf: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_stock: Dict[str, List[Dict[str, Any]]] = {}
+        # Negated weights of each posting list, ascending, for bisection
+        self._stock_weights: Dict[str, List[float]] = {}
+        self.stocks: Dict[str, Dict[str, Any]] = {}
+        self.etfs: Dict[str, Dict[str, Any]] = {}
+
+        self.version: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    async def ensure_loaded(self) -> bool:
+        """Load (or periodically reload) the index; False if it is unavailable"""
+        if self._fresh():
+            return True
+        async with self._lock:
+            if self._fresh():
+                return True
+            try:
+                self.load(*await self.loader())
+            except Exception as e:
+                metrics.dataset_errors.inc("etf_holdings")
+                logger.warning("Could not load the holdings index: %s", e)
+                return self.loaded_at is not None
+        return True
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_interval
+
+    def invalidate(self, table: str, symbols: Optional[FrozenSet[str]] = None):
+        """Re-read etf_holdings, stocks and ETFs on next use"""
+        self.loaded_at = None
+
+    def load(self, holdings: List[Dict[str, Any]], stocks: Iterable[Dict[str, Any]], etfs: Iterable[Dict[str, Any]]):
+        self.stocks = {stock["symbol"]: stock for stock in stocks}
+        self.etfs = {etf["symbol"]: etf for etf in etfs}
+        # Bumps the etf_holdings version when the rows, or the stock and ETF fields
+        # embedded in them, differ from the last load
+        versions.observe("etf_holdings", None, {
+            "holdings": holdings,
+            "stocks": {symbol: _embedded(stock, STOCK_EMBED_FIELDS) for symbol, stock in self.stocks.items()},
+            "etfs": {symbol: _embedded(etf, ETF_EMBED_FIELDS) for symbol, etf in self.etfs.items()},
+        })
+
+        version = versions.current("etf_holdings")[0]
+        if version != self.version:
+            self._index(holdings)
+            self.version = version
+        self.loaded_at = time.monotonic()
+
+    def _index(self, holdings: List[Dict[str, Any]]):
+        by_etf: Dict[str, List[Dict[str, Any]]] = {}
+        by_stock: Dict[str, List[Dict[str, Any]]] = {}
+        for row in holdings:
+            by_etf.setdefault(row["etf_symbol"].upper(), []).append(row)
+            by_stock.setdefault(row["stock_symbol"].upper(), []).append(row)
+        for postings in (*by_etf.values(), *by_stock.values()):
+            postings.sort(key=lambda row: -float(row["weight_percentage"] or 0))
+
+        self.rows = holdings
+        self.by_etf = by_etf
+        self.by_stock = by_stock
+        self._stock_weights = {
+            symbol: [-float(row["weight_percentage"] or 0) for row in postings]
+            for symbol, postings in by_stock.items()
+        }
+
+    def etf_holdings(self, symbol: str, limit: int = 50,
+                     stock_fields: Sequence[str] = ("name", "sector")) -> List[Dict[str, Any]]:
+        """Top holdings of an ETF with embedded ``stocks(<stock_fields>)``, like ``Repository.get_etf_holdings``"""
+        return [
+            {**row, "stocks": _embedded(self.stocks.get(row["stock_symbol"]), stock_fields)}
+            for row in self.by_etf.get(symbol.upper(), [])[:max(limit, 0)]
+        ]
+
+    def stock_etfs(self, symbol: str) -> List[Dict[str, Any]]:
+        """ETFs holding a stock with embedded ``etfs(name, category)``, like ``Repository.get_stock_etfs``"""
+        return [
+            {**row, "etfs": _embedded(self.etfs.get(row["etf_symbol"]), ETF_EMBED_FIELDS)}
+            for row in self.by_stock.get(symbol.upper(), [])
+        ]
+
+    def _holders(self, symbol: str, min_weight: float) -> Dict[str, float]:
+        """ETFs holding at least ``min_weight`` percent of ``symbol``, with that weight"""
+        postings = self.by_stock.get(symbol, [])
+        count = bisect_right(self._stock_weights.get(symbol, []), -min_weight)
+        return {row["etf_symbol"]: float(row["weight_percentage"]) for row in postings[:count]}
+
+    def etfs_holding(self, conditions: Sequence[Tuple[str, float]], limit: int = 50) -> List[Dict[str, Any]]:
+        """ETFs meeting every (stock, minimum weight) condition, by combined weight of those stocks"""
+        # Shortest posting-list prefix first, so the candidate set only shrinks from there
+        matches = sorted(((symbol, self._holders(symbol.upper(), min_weight)) for symbol, min_weight in conditions),
+                         key=lambda match: len(match[1]))
+
+        candidates = set(matches[0][1]) if matches else set()
+        for _, holders in matches[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(holders)
+
+        results = []
+        for etf_symbol in candidates:
+            weights = {symbol: holders[etf_symbol] for symbol, holders in matches}
+            etf = self.etfs.get(etf_symbol, {})
+            results.append({
+                "etf_symbol": etf_symbol,
+                "name": etf.get("name"),
+                "category": etf.get("category"),
+                "weights": {symbol: weights[symbol] for symbol, _ in conditions},
+                "combined_weight": round(sum(weights.values()), 4),
+            })
+        results.sort(key=lambda result: (-result["combined_weight"], result["etf_symbol"]))
+        return results[:max(limit, 0)]
+
+
+async def _load_from_repository():
+    return await asyncio.gather(
+        repository.get_all_holdings(),
+        repository.get_stocks('symbol, name, sector, market_cap'),
+        repository.get_etfs(),
+    )
+
+
+# Global instance
+holdings_index = HoldingsIndex(_load_from_repository)
+bus.subscribe(("etf_holdings", "stocks", "etfs"), holdings_index.invalidate)
@@ -0,0 +1,168 @@
+import argparse
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bulk_loader import BulkLoader
+from price_store import PriceSeries, series_from_rows
+
+SMA_WINDOWS = (20, 50, 200)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW = 12, 26
+BOLLINGER_WINDOW, BOLLINGER_STDDEV = 20, 2.0
+
+
+def align_closes(series: Mapping[str, PriceSeries]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Lay every symbol's closes on one date axis
+
+    Returns (symbols, dates, closes, observed): ``closes`` is a symbols x dates
+    matrix forward-filled across days a symbol did not trade (NaN before its
+    first bar), and ``observed`` marks the cells that are real bars.
+    """
+    symbols = sorted(series)
+    if not symbols:
+        return [], np.empty(0, dtype="datetime64[D]"), np.empty((0, 0)), np.empty((0, 0), dtype=bool)
+
+    dates = np.unique(np.concatenate([series[symbol].dates for symbol in symbols]))
+    closes = np.full((len(symbols), len(dates)), np.nan)
+    for i, symbol in enumerate(symbols):
+        closes[i, np.searchsorted(dates, series[symbol].dates)] = series[symbol].close
+    observed = ~np.isnan(closes)
+
+    # Forward fill along the date axis
+    index = np.where(observed, np.arange(len(dates)), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    closes = np.take_along_axis(closes, index, axis=1)
+    return symbols, dates, closes, observed
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Trailing window sums and counts of non-NaN values along axis 1"""
+    valid = ~np.isnan(values)
+    pad = np.zeros((values.shape[0], 1))
+    sums = np.concatenate([pad, np.cumsum(np.where(valid, values, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([pad, np.cumsum(valid, axis=1)], axis=1)
+    window_sums = sums[:, window:] - sums[:, :-window]
+    window_counts = counts[:, window:] - counts[:, :-window]
+    head = np.full((values.shape[0], min(window - 1, values.shape[1])), np.nan)
+    return (np.concatenate([head, window_sums], axis=1)[:, :values.shape[1]],
+            np.concatenate([head, window_counts], axis=1)[:, :values.shape[1]])
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    sums, counts = _rolling_sum(values, window)
+    with np.errstate(invalid="ignore"):
+        return np.where(counts == window, sums / window, np.nan)
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    sums, counts = _rolling_sum(values, window)
+    squares, _ = _rolling_sum(values * values, window)
+    with np.errstate(invalid="ignore"):
+        variance = np.maximum(squares / window - (sums / window) ** 2, 0.0)
+        return np.where(counts == window, np.sqrt(variance), np.nan)
+
+
+def ewm(values: np.ndarray, alpha: float, min_periods: int, sma_seed: bool = False) -> np.ndarray:
+    """Recursive exponential average along axis 1, vectorized across rows
+
+    Each row starts at its first non-NaN value; results before ``min_periods``
+    observations are NaN. With ``sma_seed`` the average is instead seeded with
+    the simple mean of the first ``min_periods`` observations (Wilder's
+    smoothing) and only recurses from there.
+    """
+    out = np.full(values.shape, np.nan)
+    average = np.full(values.shape[0], np.nan)
+    seen = np.zeros(values.shape[0], dtype=np.int64)
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        present = ~np.isnan(x)
+        seen += present
+        # A running mean (step 1/n) over the seed observations is their simple average
+        step = np.where(seen <= min_periods, 1.0 / np.maximum(seen, 1), alpha) if sma_seed else alpha
+        average = np.where(present & np.isnan(average), x, average)
+        average = np.where(present, average + step * (x - average), average)
+        out[:, t] = np.where(seen >= min_periods, average, np.nan)
+    return out
+
+
+def rsi(closes: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """Wilder's relative strength index"""
+    deltas = np.diff(closes, axis=1, prepend=np.nan)
+    gains = np.where(np.isnan(deltas), np.nan, np.maximum(deltas, 0.0))
+    losses = np.where(np.isnan(deltas), np.nan, np.maximum(-deltas, 0.0))
+    average_gain = ewm(gains, 1.0 / period, period, sma_seed=True)
+    average_loss = ewm(losses, 1.0 / period, period, sma_seed=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        strength = average_gain / average_loss
+        return np.where(average_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + strength))
+
+
+def compute_indicators(closes: np.ndarray) -> Dict[str, np.ndarray]:
+    """Every technical_indicators column for a symbols x dates close matrix"""
+    indicators = {f"sma_{window}": rolling_mean(closes, window) for window in SMA_WINDOWS}
+    indicators["rsi"] = rsi(closes)
+    indicators["macd"] = (ewm(closes, 2.0 / (MACD_FAST + 1), MACD_FAST)
+                          - ewm(closes, 2.0 / (MACD_SLOW + 1), MACD_SLOW))
+    middle = rolling_mean(closes, BOLLINGER_WINDOW)
+    band = BOLLINGER_STDDEV * rolling_std(closes, BOLLINGER_WINDOW)
+    indicators["bollinger_upper"] = middle + band
+    indicators["bollinger_lower"] = middle - band
+    return indicators
+
+
+# Decimal places matching the technical_indicators column types
+_PRECISION = {"sma_20": 4, "sma_50": 4, "sma_200": 4, "rsi": 2, "macd": 4,
+              "bollinger_upper": 4, "bollinger_lower": 4}
+
+
+def indicator_rows(series: Mapping[str, PriceSeries], since: Optional[str] = None) -> List[Dict[str, Any]]:
+    """technical_indicators rows for every real bar (on or after ``since``)"""
+    symbols, dates, closes, observed = align_closes(series)
+    if not symbols:
+        return []
+    indicators = compute_indicators(closes)
+
+    mask = observed.copy()
+    if since is not None:
+        mask &= dates >= np.datetime64(since, "D")
+    rows_idx, cols_idx = np.nonzero(mask)
+    date_strings = dates.astype(str)
+
+    columns = {}
+    for name, values in indicators.items():
+        picked = np.round(values[rows_idx, cols_idx], _PRECISION[name])
+        columns[name] = [None if value != value else value for value in picked.tolist()]
+
+    return [
+        {"symbol": symbols[r], "date": date_strings[c], **{name: columns[name][i] for name in columns}}
+        for i, (r, c) in enumerate(zip(rows_idx.tolist(), cols_idx.tolist()))
+    ]
+
+
+def recompute_technical_indicators(backend=None, since: Optional[str] = None, batch_size: int = 1000) -> int:
+    """Recompute technical_indicators from stock_prices and upsert them
+
+    Rows are written through ``BulkLoader``, which records the table in the
+    invalidations log so running API workers drop what they derived from it.
+    """
+    loader = BulkLoader(backend, batch_size=batch_size)
+
+    start_time = time.time()
+    series = series_from_rows(loader.backend.get_all_prices('stock_prices'))
+    rows = indicator_rows(series, since)
+    compute_time = time.time() - start_time
+
+    written = loader.load('technical_indicators', rows)["rows"]
+
+    print(f"📊 Computed {len(rows)} indicator rows for {len(series)} symbols in {compute_time * 1000:.0f}ms, "
+          f"wrote {written} in {time.time() - start_time:.1f}s")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute technical indicators from stock prices")
+    parser.add_argument("--since", help="Only write rows on or after this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    recompute_technical_indicators(since=args.since)
@@ -1,6 +1,7 @@
-from supabase_db import supabase_db
 from datetime import date
 
+from bulk_loader import BulkLoader
+
 def insert_sample_data():
     print("Inserting sample data...")
     
@@ -39,25 +40,16 @@ def insert_sample_data():
     ]
     
     try:
-        # Insert stocks
-        for stock in stocks:
-            result = supabase_db.insert_stock(stock)
-            print(f"✅ Inserted stock: {stock['symbol']}")
-        
-        # Insert sectors
-        for sector in sectors:
-            result = supabase_db.insert_sector(sector)
-            print(f"✅ Inserted sector: {sector['name']}")
-        
-        # Insert stock prices
-        for price in stock_prices:
-            result = supabase_db.insert_stock_price(price)
-            print(f"✅ Inserted price for: {price['symbol']} on {price['date']}")
-        
-        # Insert fundamentals (using raw supabase client)
-        for fundamental in fundamentals:
-            result = supabase_db.supabase.table('fundamentals').insert(fundamental).execute()
-            print(f"✅ Inserted fundamentals for: {fundamental['symbol']}")
+        reports = BulkLoader().load_all([
+            ('stocks', stocks),
+            ('sectors', sectors),
+            ('stock_prices', stock_prices),
+            ('fundamentals', fundamentals),
+        ])
+        failed = sum(report['failed'] for report in reports)
+        if failed:
+            print(f"\n⚠️  {failed} rows could not be inserted")
+            return
         
         print("\n🎉 Sample data inserted successfully!")
         
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+import metrics
+from repository import repository
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reads of the invalidations log for writes made by other processes (0: never)
+INVALIDATION_POLL = float(os.getenv("INVALIDATION_POLL", "2"))
+
+# Log rows read per query while catching up
+POLL_BATCH = 1000
+
+# Tags this process's log rows so it does not replay its own writes
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{int(time.time() * 1000):x}"
+
+# callback(table, symbols): ``symbols`` is None when any row of the table may have changed
+Subscriber = Callable[[str, Optional[FrozenSet[str]]], None]
+
+
+class InvalidationBus:
+    """Write notifications keyed by table and symbol
+
+    Every write path ``publish``-es the table it wrote and the symbols it
+    touched; caches and in-memory engines ``subscribe`` to the tables they are
+    derived from and drop just what changed, so they can keep long TTLs and
+    still reflect writes immediately. Each publish is also appended to the
+    ``invalidations`` table, and ``poll`` replays the rows other processes
+    appended (other uvicorn workers, the seeding scripts), so every worker
+    catches up within ``INVALIDATION_POLL`` seconds.
+    """
+
+    def __init__(self, origin: str = ORIGIN):
+        self.origin = origin
+        self._subscribers: Dict[str, List[Tuple[Subscriber, bool]]] = {}
+        self.last_id: Optional[int] = None
+        # table -> symbols written but not yet recorded in the log (None: the whole table)
+        self._unrecorded: Dict[str, Optional[set]] = {}
+        self._recorder: Optional[asyncio.Task] = None
+
+    def subscribe(self, tables: Iterable[str], callback: Subscriber, remote_only: bool = False):
+        """Call ``callback`` on writes to ``tables``; ``remote_only`` skips this process's own writes"""
+        for table in tables:
+            self._subscribers.setdefault(table, []).append((callback, remote_only))
+
+    def dispatch(self, table: str, symbols: Optional[Iterable[str]] = None, remote: bool = False):
+        """Notify subscribers of ``table`` without recording anything"""
+        symbols = frozenset(symbol.upper() for symbol in symbols) if symbols is not None else None
+        metrics.invalidations.inc(table, "remote" if remote else "local")
+        for callback, remote_only in self._subscribers.get(table, []):
+            if remote or not remote_only:
+                callback(table, symbols)
+
+    async def publish(self, table: str, symbols: Optional[Iterable[str]] = None):
+        """Announce a write to this process's subscribers and, through the log, to every other process
+
+        Subscribers are notified before this returns; the log row is written
+        in the background, merged with any other writes to ``table`` still
+        waiting for it, so the request that wrote does not wait on a second
+        database write.
+        """
+        symbols = {symbol.upper() for symbol in symbols} if symbols is not None else None
+        self.dispatch(table, symbols)
+        if symbols is None:
+            self._unrecorded[table] = None
+        elif self._unrecorded.setdefault(table, set()) is not None:
+            self._unrecorded[table].update(symbols)
+        if self._recorder is None or self._recorder.done():
+            self._recorder = asyncio.create_task(self._record())
+
+    async def _record(self):
+        """Append the unrecorded writes to the log, one row per table"""
+        while self._unrecorded:
+            table, symbols = self._unrecorded.popitem()
+            try:
+                await repository.record_invalidation(self.origin, table,
+                                                     sorted(symbols) if symbols is not None else None)
+            except Exception as e:
+                # The write itself succeeded; other processes fall back to their TTLs
+                metrics.invalidation_errors.inc("record")
+                logger.warning("Could not record the invalidation of %s: %s", table, e)
+
+    async def flush(self):
+        """Wait until every published write is in the log"""
+        if self._recorder is not None:
+            await self._recorder
+
+    async def poll(self):
+        """Dispatch the log rows recorded by other processes since the last poll"""
+        if self.last_id is None:
+            # Start from the end of the log: anything older predates this process's caches
+            self.last_id = await repository.last_invalidation_id()
+            return
+        # One dispatch per table, so a burst of small writes costs subscribers a single refresh
+        changed: Dict[str, Optional[set]] = {}
+        while True:
+            rows = await repository.get_invalidations(self.last_id, POLL_BATCH)
+            for row in rows:
+                self.last_id = row["id"]
+                if row["origin"] == self.origin:
+                    continue
+                table = row["table_name"]
+                if row["symbols"] is None:
+                    changed[table] = None
+                elif changed.setdefault(table, set()) is not None:
+                    changed[table].update(row["symbols"].split(","))
+            if len(rows) < POLL_BATCH:
+                break
+        for table, symbols in changed.items():
+            self.dispatch(table, symbols, remote=True)
+
+    async def run(self, interval: float = INVALIDATION_POLL):
+        """Poll the log every ``interval`` seconds until cancelled"""
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                metrics.invalidation_errors.inc("poll")
+                logger.warning("Could not read the invalidations log: %s", e)
+            await asyncio.sleep(interval)
+
+
+# Global instance
+bus = InvalidationBus()
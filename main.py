@@ -1,23 +1,62 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from typing import List, Optional
 import os
 from dotenv import load_dotenv
-from functools import lru_cache
-import time
 
-from models import Stock, StockPrice, Sector, Fundamentals, TechnicalIndicators, ScreenerRequest
-from supabase_db import supabase_db
-from etf_routes import get_etf, get_etf_prices, get_all_etfs, get_etfs_by_category, get_leveraged_etfs
+from models import Stock, StockPrice, Sector, Fundamentals, TechnicalIndicators, ScreenerRequest, ExposureRequest
+from repository import repository, with_timeout
+from cache import CACHE_TTL, cached, cache_stats
+from rankings import ranking_engine
+from sector_performance import sector_engine
+from price_store import stock_price_store, etf_price_store
+from screener import SORT_COLUMNS, get_screener_snapshot
+from exposure import exposure_engine
+from streaming import price_history_response
+from versions import versions
+from invalidation import INVALIDATION_POLL, bus
+from serialization import FastJSONResponse
+from compression import CompressionMiddleware
+import metrics
+from metrics import MetricsMiddleware
+from startup import start, warmup_datasets
+from batch import parse_symbols, get_stock_quotes, get_etf_quotes, get_price_histories
+from etf_routes import (get_etf, get_etf_prices, upsert_etf_prices, get_all_etfs, get_etfs_by_category,
+                        get_leveraged_etfs, get_etf_holdings_response, get_stock_etfs, get_etfs_holding)
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the database, and preload the STARTUP_WARMUP datasets before serving
+    warmup = warmup_datasets()
+    await start(warmup)
+    # Load the price stores in the background otherwise; requests wait for them on first use
+    preload = [asyncio.create_task(store.ensure_loaded()) for store in (stock_price_store, etf_price_store)
+               if store.table not in warmup]
+    # Replay writes made by other workers and the seeding scripts
+    if INVALIDATION_POLL > 0:
+        preload.append(asyncio.create_task(bus.run(INVALIDATION_POLL)))
+    yield
+    for task in preload:
+        task.cancel()
+    await asyncio.gather(bus.flush(), stock_price_store.flush(), etf_price_store.flush())
+    repository.shutdown()
+
 app = FastAPI(
     title="FinStocks API",
     description="Financial stocks and ETFs data API with screening and analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Compress larger responses (brotli when available, else gzip)
+app.add_middleware(CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -27,37 +66,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency, status and in-flight metrics (outermost, so it times everything)
+app.add_middleware(MetricsMiddleware)
+
 # Health check
 @app.get("/health")
 async def health_check():
     return {"status": "OK", "message": "FinStocks API is running with Supabase"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: request/query latency histograms, in-flight gauges, cache and error counters"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss statistics for every response cache"""
+    return cache_stats()
+
 # STOCK ENDPOINTS
+# Batch routes are declared before /api/stocks/{symbol} so "batch" is not read as a symbol
+@app.get("/api/stocks/batch")
+async def get_stocks_batch(symbols: str):
+    """Details, latest price, previous close and fundamentals for comma-separated ``symbols``"""
+    symbols = parse_symbols(symbols)
+    try:
+        return await get_stock_quotes(symbols)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/stocks/batch/prices")
+async def get_stock_prices_batch(symbols: str, days: int = 30):
+    """Price history for comma-separated ``symbols``, keyed by symbol"""
+    symbols = parse_symbols(symbols)
+    try:
+        return await get_price_histories(stock_price_store, symbols, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/stocks/{symbol}")
 async def get_stock(symbol: str):
     """Get stock details with latest price and fundamentals"""
     try:
         symbol = symbol.upper()
         
-        # Get basic stock info
-        stock_result = supabase_db.get_stock(symbol)
-        if not stock_result.data:
+        # Stock row and its latest snapshot (price, previous close, fundamentals)
+        # are fetched concurrently by primary key; the snapshot degrades to null
+        stock, snapshot = await asyncio.gather(
+            repository.get_stock(symbol),
+            with_timeout(repository.get_snapshot('stock', symbol))
+        )
+        if not stock:
             raise HTTPException(status_code=404, detail="Stock not found")
         
-        stock = stock_result.data[0]
-        
-        # Get latest price
-        price_result = supabase_db.get_stock_prices(symbol, 1)
-        latest_price = price_result.data[0] if price_result.data else None
-        
-        # Get latest fundamentals
-        fundamentals_result = supabase_db.supabase.table('fundamentals').select('*').eq('symbol', symbol).order('year', desc=True).order('quarter', desc=True).limit(1).execute()
-        fundamentals = fundamentals_result.data[0] if fundamentals_result.data else None
+        snapshot = snapshot or {}
         
         return {
             **stock,
-            "latest_price": latest_price,
-            "fundamentals": fundamentals
+            "latest_price": snapshot.get("latest_price"),
+            "previous_close": snapshot.get("previous_close"),
+            "fundamentals": snapshot.get("fundamentals")
         }
     except HTTPException:
         raise
@@ -65,12 +133,14 @@ async def get_stock(symbol: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/stocks/{symbol}/prices")
-async def get_stock_prices(symbol: str, days: int = 30):
-    """Get stock price history"""
+async def get_stock_prices(symbol: str, request: Request, days: int = 30, format: str = "json",
+                           interval: str = "1d"):
+    """Get stock price history at ``interval`` (1d, 1w, 1m or 1q); ``format=ndjson`` or ``csv`` streams it"""
     try:
-        symbol = symbol.upper()
-        result = supabase_db.get_stock_prices(symbol, days)
-        return result.data
+        return await price_history_response(request, stock_price_store, symbol, days, format,
+                                            repository.get_stock_prices, interval)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -79,111 +149,150 @@ async def get_technical_indicators(symbol: str):
     """Get latest technical indicators"""
     try:
         symbol = symbol.upper()
-        result = supabase_db.supabase.table('technical_indicators').select('*').eq('symbol', symbol).order('date', desc=True).limit(1).execute()
-        return result.data[0] if result.data else {}
+        snapshot = await repository.get_snapshot('stock', symbol)
+        return (snapshot or {}).get("technical_indicators") or {}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/stocks/{symbol}/etfs")
-async def get_stock_etfs(symbol: str):
+async def get_etfs_holding_stock(symbol: str):
     """Get ETFs that hold this stock"""
-    try:
-        symbol = symbol.upper()
-        result = supabase_db.supabase.table('etf_holdings').select('*, etfs(name, category)').eq('stock_symbol', symbol).order('weight_percentage', desc=True).execute()
-        return result.data
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await get_stock_etfs(symbol)
 
 @app.post("/api/stocks")
 async def create_stock(stock: Stock):
     """Add new stock"""
     try:
-        result = supabase_db.insert_stock({
+        row = await repository.insert_stock({
             "symbol": stock.symbol.upper(),
             "name": stock.name,
             "sector": stock.sector,
             "industry": stock.industry,
             "market_cap": stock.market_cap
         })
-        return {"id": result.data[0]["id"], "symbol": stock.symbol.upper()}
+        await bus.publish("stocks", [stock.symbol])
+        return {"id": row["id"], "symbol": stock.symbol.upper()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/stocks/prices")
+async def upsert_stock_prices(prices: List[StockPrice]):
+    """Add or update daily price bars"""
+    try:
+        rows = [
+            {**price.model_dump(mode="json", exclude={"id", "created_at"}), "symbol": price.symbol.upper()}
+            for price in prices
+        ]
+        written = await repository.upsert_stock_prices(rows)
+        await stock_price_store.append(rows)
+        ranking_engine.apply_bars(rows)
+        sector_engine.apply_bars(rows)
+        await bus.publish("stock_prices", [row["symbol"] for row in rows])
+        return {"written": written}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ETF ENDPOINTS
 @app.get("/api/etfs")
-async def get_etfs():
-    """Get all ETFs"""
-    return get_all_etfs()
+async def get_etfs(request: Request):
+    """Get all ETFs; supports If-None-Match"""
+    return versions.conditional(request, await get_all_etfs(), "etfs")
+
+@app.get("/api/etfs/batch")
+async def get_etfs_batch(symbols: str):
+    """ETF details with latest price for comma-separated ``symbols``"""
+    symbols = parse_symbols(symbols)
+    try:
+        return await get_etf_quotes(symbols)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/etfs/batch/prices")
+async def get_etf_prices_batch(symbols: str, days: int = 30):
+    """ETF price history for comma-separated ``symbols``, keyed by symbol"""
+    symbols = parse_symbols(symbols)
+    try:
+        return await get_price_histories(etf_price_store, symbols, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/etfs/holding")
+async def get_etfs_holding_stocks(stocks: str, limit: int = 50):
+    """ETFs holding every listed stock at a minimum weight, e.g. ``stocks=NVDA:5,MSFT:3``"""
+    return await get_etfs_holding(stocks, limit)
+
+@app.get("/api/etfs/overlap")
+async def get_etf_overlap(symbols: Optional[str] = None):
+    """Pairwise holdings overlap and cosine similarity of comma-separated ``symbols`` (default: all ETFs)"""
+    requested = parse_symbols(symbols) if symbols is not None else None
+    try:
+        if not await exposure_engine.ensure_loaded():
+            raise HTTPException(status_code=503, detail="ETF holdings are unavailable")
+        return exposure_engine.overlap(requested)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/etfs/leveraged")
+async def get_leveraged_etf_list():
+    """Get leveraged ETFs (3x, etc.)"""
+    return await get_leveraged_etfs()
 
 @app.get("/api/etfs/{symbol}")
 async def get_etf_details(symbol: str):
     """Get ETF details with latest price"""
-    return get_etf(symbol)
+    return await get_etf(symbol)
 
 @app.get("/api/etfs/{symbol}/prices")
-async def get_etf_price_history(symbol: str, days: int = 30):
-    """Get ETF price history"""
-    return get_etf_prices(symbol, days)
+async def get_etf_price_history(symbol: str, request: Request, days: int = 30, format: str = "json",
+                                interval: str = "1d"):
+    """Get ETF price history at ``interval`` (1d, 1w, 1m or 1q); ``format=ndjson`` or ``csv`` streams it"""
+    return await get_etf_prices(symbol, request, days, format, interval)
+
+@app.post("/api/etfs/prices")
+async def upsert_etf_price_bars(prices: List[StockPrice]):
+    """Add or update daily ETF price bars"""
+    return await upsert_etf_prices(prices)
 
 @app.get("/api/etfs/{symbol}/holdings")
-async def get_etf_holdings(symbol: str, limit: int = 50):
-    """Get ETF holdings with stock weights"""
-    try:
-        symbol = symbol.upper()
-        result = supabase_db.supabase.table('etf_holdings').select('*, stocks(name, sector)').eq('etf_symbol', symbol).order('weight_percentage', desc=True).limit(limit).execute()
-        return result.data
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_etf_holdings(symbol: str, request: Request, limit: int = 50):
+    """Get ETF holdings with stock weights; supports If-None-Match"""
+    return await get_etf_holdings_response(request, symbol, limit, ("name", "sector"))
 
 @app.get("/api/etfs/{symbol}/top-holdings")
-async def get_etf_top_holdings(symbol: str, limit: int = 10):
-    """Get top holdings of an ETF"""
-    try:
-        symbol = symbol.upper()
-        result = supabase_db.supabase.table('etf_holdings').select('*, stocks(name, sector, market_cap)').eq('etf_symbol', symbol).order('weight_percentage', desc=True).limit(limit).execute()
-        return result.data
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_etf_top_holdings(symbol: str, request: Request, limit: int = 10):
+    """Get top holdings of an ETF; supports If-None-Match"""
+    return await get_etf_holdings_response(request, symbol, limit, ("name", "sector", "market_cap"))
 
 @app.get("/api/etfs/category/{category}")
 async def get_etfs_in_category(category: str):
     """Get ETFs by category"""
-    return get_etfs_by_category(category)
-
-@app.get("/api/etfs/leveraged")
-async def get_leveraged_etf_list():
-    """Get leveraged ETFs (3x, etc.)"""
-    return get_leveraged_etfs()
+    return await get_etfs_by_category(category)
 
 # SECTOR ENDPOINTS
-@lru_cache(maxsize=10)
-def get_cached_all_sectors_data(cache_key: str):
-    """Cached all sectors data"""
-    start_time = time.time()
-    
-    result = supabase_db.get_sectors()
-    
-    end_time = time.time()
-    query_time = (end_time - start_time) * 1000
-    print(f"🏭 Supabase all sectors query took: {query_time:.2f}ms")
-    
-    return result.data
+@cached("all_sectors", ttl=CACHE_TTL, max_entries=10, invalidated_by=("sectors",))
+async def get_cached_all_sectors_data():
+    """Cached stored sectors rows (used when prices are unavailable)"""
+    result = await repository.get_sectors()
+    versions.observe("sectors", None, result)
+    return result
 
 @app.get("/api/sectors")
-async def get_sectors():
-    """Get all sectors performance - now cached"""
+async def get_sectors(request: Request):
+    """Get all sectors with performance computed from constituent prices; supports If-None-Match"""
     try:
-        # Cache for 30 seconds
-        cache_key = str(int(time.time() // 30))
-        return get_cached_all_sectors_data(cache_key)
+        if await sector_engine.ensure_loaded():
+            sectors = sector_engine.all_sectors()
+        else:
+            sectors = await get_cached_all_sectors_data()
+        return versions.conditional(request, sectors, "sectors")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@lru_cache(maxsize=50)
-def get_cached_sectors_data(period: str, limit: int, cache_key: str):
-    """Cached sectors data"""
-    start_time = time.time()
-    
+@cached("top_sectors", ttl=CACHE_TTL, max_entries=50, invalidated_by=("sectors",))
+async def get_cached_sectors_data(period: str, limit: int):
+    """Cached stored top sectors (used when prices are unavailable)"""
     period_map = {
         "1d": "performance_1d",
         "1w": "performance_1w", 
@@ -192,21 +301,19 @@ def get_cached_sectors_data(period: str, limit: int, cache_key: str):
     }
     
     order_by = period_map.get(period, "performance_1d")
-    result = supabase_db.supabase.table('sectors').select('*').order(order_by, desc=True).limit(limit).execute()
-    
-    end_time = time.time()
-    query_time = (end_time - start_time) * 1000
-    print(f"📊 Supabase sectors query took: {query_time:.2f}ms")
-    
-    return result.data
+    result = await repository.get_top_sectors(order_by, limit)
+    versions.observe("sectors", ("top", period, limit), result)
+    return result
 
 @app.get("/api/sectors/top-performers")
-async def get_top_sectors(period: str = "1d", limit: int = 5):
-    """Get top performing sectors - 30 second cache for real-time data"""
+async def get_top_sectors(request: Request, period: str = "1d", limit: int = 5):
+    """Get top performing sectors over ``period`` (1d, 1w, 1m or ytd); supports If-None-Match"""
     try:
-        # Cache for 30 seconds
-        cache_key = str(int(time.time() // 30))
-        return get_cached_sectors_data(period, limit, cache_key)
+        if await sector_engine.ensure_loaded():
+            data = sector_engine.top_sectors(period, limit)
+        else:
+            data = await get_cached_sectors_data(period, limit)
+        return versions.conditional(request, data, "sectors", ("top", period, limit))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -214,72 +321,70 @@ async def get_top_sectors(period: str = "1d", limit: int = 5):
 async def get_sector_stocks(sector_name: str):
     """Get stocks in a sector"""
     try:
-        result = supabase_db.supabase.table('stocks').select('*').eq('sector', sector_name).order('market_cap', desc=True).execute()
-        return result.data
+        return await repository.get_sector_stocks(sector_name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # SCREENER ENDPOINTS
-@lru_cache(maxsize=100)
-def get_cached_screener_data(limit: int, sectors: str, min_cap: int, max_cap: int, cache_key: str):
-    """Cached screener data - simplified query for speed"""
-    start_time = time.time()
-    
-    # Simple query - just stocks table, no joins
-    query = supabase_db.supabase.table('stocks').select('symbol, name, sector, market_cap')
-    
-    if sectors and sectors != "None":
-        sector_list = sectors.split(",")
-        query = query.in_('sector', sector_list)
-    
-    if min_cap and min_cap > 0:
-        query = query.gte('market_cap', min_cap)
-    
-    if max_cap and max_cap > 0:
-        query = query.lte('market_cap', max_cap)
-    
-    result = query.limit(limit).execute()
-    
-    end_time = time.time()
-    query_time = (end_time - start_time) * 1000  # Convert to milliseconds
-    print(f"🔍 Supabase screener query took: {query_time:.2f}ms")
-    
-    return result.data
-
 @app.post("/api/screener")
 async def screen_stocks(request: ScreenerRequest):
-    """Screen stocks with filters - 30 second cache for real-time data"""
+    """Screen stocks on market cap, P/E, ROE, price and sector, sorted by any column"""
+    sort_by = request.sort_by or "market_cap"
+    if sort_by not in SORT_COLUMNS:
+        raise HTTPException(status_code=400,
+                            detail=f"Cannot sort by '{sort_by}', expected one of {sorted(SORT_COLUMNS)}")
+    if request.limit is not None and request.limit < 0:
+        raise HTTPException(status_code=400, detail="limit must not be negative")
     try:
-        # Create cache key that changes every 30 seconds
-        cache_key = str(int(time.time() // 30))  # 30 seconds for real-time
-        
-        # Convert request to cacheable parameters
-        sectors_str = ",".join(request.sectors) if request.sectors else "None"
-        min_cap = request.min_market_cap or 0
-        max_cap = request.max_market_cap or 0
-        limit = request.limit or 50
-        
-        return get_cached_screener_data(limit, sectors_str, min_cap, max_cap, cache_key)
+        snapshot = await get_screener_snapshot()
+        # A market cap bound of 0 (or less) means no bound, as it always has
+        return snapshot.screen(
+            min_market_cap=request.min_market_cap if (request.min_market_cap or 0) > 0 else None,
+            max_market_cap=request.max_market_cap if (request.max_market_cap or 0) > 0 else None,
+            min_pe_ratio=request.min_pe_ratio,
+            max_pe_ratio=request.max_pe_ratio,
+            min_roe=request.min_roe,
+            sectors=request.sectors,
+            min_price=request.min_price,
+            max_price=request.max_price,
+            sort_by=sort_by,
+            sort_desc=request.sort_desc if request.sort_desc is not None else True,
+            limit=request.limit or 50
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/screener/gainers")
 async def get_top_gainers(limit: int = 10):
-    """Get top gaining stocks"""
+    """Get top gaining stocks by daily percent change"""
     try:
-        # Get stocks with recent prices
-        result = supabase_db.supabase.table('stocks').select('symbol, name, sector').limit(limit).execute()
-        return result.data
+        await ranking_engine.ensure_loaded()
+        return ranking_engine.gainers(limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/screener/losers")
 async def get_top_losers(limit: int = 10):
-    """Get top losing stocks"""
+    """Get top losing stocks by daily percent change"""
+    try:
+        await ranking_engine.ensure_loaded()
+        return ranking_engine.losers(limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# PORTFOLIO ENDPOINTS
+@app.post("/api/portfolio/exposure")
+async def get_portfolio_exposure(request: ExposureRequest):
+    """Look-through stock and sector exposure of a set of ETF positions (symbol and market value)"""
+    if request.limit is not None and request.limit < 0:
+        raise HTTPException(status_code=400, detail="limit must not be negative")
     try:
-        # Get stocks with recent prices
-        result = supabase_db.supabase.table('stocks').select('symbol, name, sector').limit(limit).execute()
-        return result.data
+        if not await exposure_engine.ensure_loaded():
+            raise HTTPException(status_code=503, detail="ETF holdings are unavailable")
+        return exposure_engine.exposure(((position.symbol, position.value) for position in request.positions),
+                                        limit=request.limit)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,202 @@
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every metric registers itself here, in the order it is exposed
+REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}"
+                for labels, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    """Value per label set that can go up and down"""
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution per label set
+
+    ``observe`` is a bisect plus three additions, so timing every request and
+    query costs well under a microsecond; buckets are only accumulated into
+    the cumulative Prometheus form when scraped.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+# HTTP
+http_request_duration = Histogram("http_request_duration_seconds", "Request latency by route", ("method", "route"))
+http_requests = Counter("http_requests_total", "Requests by route and status code", ("method", "route", "status"))
+http_errors = Counter("http_request_errors_total", "Requests that failed with a 5xx or an unhandled exception",
+                      ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "Requests currently being handled")
+
+# Database (one series per repository operation; ``table`` is set for operations that take the table
+# as an argument, such as get_all_prices on stock_prices or etf_prices, and empty otherwise)
+db_query_duration = Histogram("db_query_duration_seconds", "Repository call latency by operation and table",
+                              ("operation", "table"))
+db_query_errors = Counter("db_query_errors_total", "Repository calls that raised", ("operation", "table"))
+db_in_flight = Gauge("db_queries_in_flight", "Repository calls queued or running on the database executor")
+
+# Invalidation (local: published by this process's writes; remote: replayed from the shared log)
+invalidations = Counter("invalidations_total", "Write notifications dispatched to caches, by table and source",
+                        ("table", "source"))
+invalidation_errors = Counter("invalidation_errors_total",
+                              "Failed writes (record) and reads (poll) of the invalidations log", ("action",))
+
+# In-memory datasets (price stores, holdings index) that could not be (re)loaded or published
+dataset_errors = Counter("dataset_load_errors_total", "Failed loads of in-memory datasets", ("dataset",))
+
+
+def _cache_lines() -> List[str]:
+    """Cache gauges read from ``cache.CACHES`` at scrape time, so lookups pay nothing extra"""
+    from cache import CACHES
+
+    fields = (
+        ("hits", "counter", "Lookups served fresh from the cache"),
+        ("stale_hits", "counter", "Lookups served stale while refreshing"),
+        ("misses", "counter", "Lookups that waited for a load"),
+        ("load_errors", "counter", "Loads that raised"),
+        ("evictions", "counter", "Entries evicted for size"),
+        ("entries", "gauge", "Entries currently cached"),
+        ("bytes", "gauge", "Approximate bytes currently cached"),
+        ("hit_ratio", "gauge", "(hits + stale hits) / lookups"),
+    )
+    stats = {name: cache.stats() for name, cache in sorted(CACHES.items())}
+    lines = []
+    for field, kind, help in fields:
+        name = f"cache_{field}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for cache_name, values in stats.items():
+            if values[field] is not None:
+                lines.append(f'{name}{{cache="{_escape(cache_name)}"}} {values[field]:g}')
+    return lines
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += _cache_lines()
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts it by route template and status
+
+    Routes are labelled with their template (``/api/stocks/{symbol}``), never
+    the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            elapsed = time.perf_counter() - start_time
+            http_in_flight.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(elapsed, method, route)
+            http_requests.inc(method, route, str(status))
+            if status >= 500:
+                http_errors.inc(method, route)
@@ -70,4 +70,14 @@ class ScreenerRequest(BaseModel):
     sectors: Optional[List[str]] = None
     min_price: Optional[float] = None
     max_price: Optional[float] = None
+    sort_by: Optional[str] = "market_cap"
+    sort_desc: Optional[bool] = True
+    limit: Optional[int] = 50
+
+class Position(BaseModel):
+    symbol: str
+    value: float
+
+class ExposureRequest(BaseModel):
+    positions: List[Position]
     limit: Optional[int] = 50
@@ -0,0 +1,481 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+import metrics
+from invalidation import bus
+from repository import repository
+from shared_prices import Segment, SharedPriceSegment
+from versions import versions
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a store reloads from the database to pick up out-of-process writes
+PRICE_STORE_REFRESH = float(os.getenv("PRICE_STORE_REFRESH", "900"))
+
+# Directory (ideally on tmpfs, e.g. /dev/shm/finstocks) holding one memory-mapped copy of
+# each price table shared by every worker on the host; empty keeps a copy per process
+PRICE_STORE_SHARED_DIR = os.getenv("PRICE_STORE_SHARED_DIR", "")
+
+# Seconds a worker collects posted bars before republishing the shared table with all of them
+PRICE_STORE_PUBLISH_INTERVAL = float(os.getenv("PRICE_STORE_PUBLISH_INTERVAL", "0.5"))
+
+PRICE_COLUMNS = ("open_price", "high_price", "low_price", "close_price", "volume")
+
+# Bar intervals the price history can be resampled to
+INTERVALS = ("1d", "1w", "1m", "1q")
+
+
+def period_starts(dates: np.ndarray, interval: str) -> np.ndarray:
+    """The first calendar day of the ``interval`` period (Monday-based weeks) containing each date"""
+    if interval == "1d":
+        return dates
+    if interval == "1w":
+        # 1970-01-01 was a Thursday: weekday (Monday = 0) is (days + 3) % 7
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+    if interval == "1m":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    if interval == "1q":
+        months = dates.astype("datetime64[M]").astype(np.int64)
+        return (months - months % 3).astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown interval '{interval}', expected one of {', '.join(INTERVALS)}")
+
+
+class PriceSeries:
+    """Columnar daily bars of one symbol, oldest first
+
+    Arrays are over-allocated so appends are amortized O(1); the public
+    properties are views over the filled prefix, so callers can run NumPy code
+    on them without copying. A series may also view read-only shared memory,
+    which is copied to private arrays on its first write.
+    """
+
+    def __init__(self, symbol: str, capacity: int = 512):
+        self.symbol = symbol
+        self.length = 0
+        self._dates = np.empty(capacity, dtype="datetime64[D]")
+        self._columns = {name: np.empty(capacity, dtype=np.float64) for name in PRICE_COLUMNS}
+        # Resampled copies by interval, dropped whenever a bar changes
+        self._resampled: Dict[str, "PriceSeries"] = {}
+
+    @classmethod
+    def from_rows(cls, symbol: str, rows: List[Dict[str, Any]]) -> "PriceSeries":
+        """Build from rows already sorted by date"""
+        series = cls(symbol, capacity=max(512, len(rows) * 2))
+        n = series.length = len(rows)
+        series._dates[:n] = np.array([row["date"] for row in rows], dtype="datetime64[D]")
+        for name in PRICE_COLUMNS:
+            series._columns[name][:n] = np.array([row.get(name) for row in rows], dtype=np.float64)
+        return series
+
+    @classmethod
+    def view(cls, symbol: str, dates: np.ndarray, columns: Dict[str, np.ndarray]) -> "PriceSeries":
+        """Wrap existing arrays (e.g. a shared segment) without copying them"""
+        series = cls(symbol, capacity=0)
+        series.length = len(dates)
+        series._dates = dates
+        series._columns = dict(columns)
+        return series
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._dates[:self.length]
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._columns["open_price"][:self.length]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._columns["high_price"][:self.length]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._columns["low_price"][:self.length]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._columns["close_price"][:self.length]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._columns["volume"][:self.length]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self.length]
+
+    def upsert(self, row: Dict[str, Any]):
+        """Insert or replace one bar, keeping dates sorted"""
+        bar_date = np.datetime64(str(row["date"])[:10], "D")
+        self._resampled.clear()
+        values = {name: np.nan if row.get(name) is None else float(row[name]) for name in PRICE_COLUMNS}
+        self._reserve(self.length + 1)
+
+        if self.length and bar_date <= self._dates[self.length - 1]:
+            index = int(np.searchsorted(self.dates, bar_date))
+            if self._dates[index] == bar_date:
+                for name, value in values.items():
+                    self._columns[name][index] = value
+                return
+            # Back-filled bar: shift the tail (rare)
+            self._dates[index + 1:self.length + 1] = self._dates[index:self.length]
+            for column in self._columns.values():
+                column[index + 1:self.length + 1] = column[index:self.length]
+        else:
+            index = self.length
+
+        self._dates[index] = bar_date
+        for name, value in values.items():
+            self._columns[name][index] = value
+        self.length += 1
+
+    def _reserve(self, size: int):
+        # Shared (read-only) arrays are copied before the first write
+        if size <= len(self._dates) and self._dates.flags.writeable:
+            return
+        capacity = max(size, len(self._dates) * 2)
+        dates = np.empty(capacity, dtype=self._dates.dtype)
+        dates[:self.length] = self.dates
+        self._dates = dates
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=np.float64)
+            grown[:self.length] = column[:self.length]
+            self._columns[name] = grown
+
+    def resampled(self, interval: str) -> "PriceSeries":
+        """OHLCV bars aggregated per ``interval`` period, dated by the period's first calendar day"""
+        if interval == "1d":
+            return self
+        series = self._resampled.get(interval)
+        if series is None:
+            series = self._resampled[interval] = self._resample(interval)
+        return series
+
+    def _resample(self, interval: str) -> "PriceSeries":
+        starts = period_starts(self.dates, interval)
+        series = PriceSeries(self.symbol, capacity=len(starts))
+        if not self.length:
+            return series
+        # Index of the first bar of each period, and of the last
+        first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+        last = np.r_[first[1:], self.length] - 1
+        n = series.length = len(first)
+        series._dates[:n] = starts[first]
+        series._columns["open_price"][:n] = self.open[first]
+        series._columns["high_price"][:n] = np.fmax.reduceat(self.high, first)
+        series._columns["low_price"][:n] = np.fmin.reduceat(self.low, first)
+        series._columns["close_price"][:n] = self.close[last]
+        series._columns["volume"][:n] = np.add.reduceat(np.nan_to_num(self.volume), first)
+        return series
+
+    def window(self, days: int, interval: str = "1d") -> Tuple["PriceSeries", int]:
+        """The series at ``interval`` and how many of its latest bars cover the last ``days`` daily bars
+
+        A period only partly inside the window is included whole, so the first
+        resampled bar is a complete candle.
+        """
+        series = self.resampled(interval)
+        if days <= 0 or not self.length:
+            return series, 0
+        if interval == "1d":
+            return series, min(days, self.length)
+        first = period_starts(self.dates[max(self.length - days, 0):][:1], interval)[0]
+        return series, series.length - int(np.searchsorted(series.dates, first))
+
+    def rows(self, days: int) -> List[Dict[str, Any]]:
+        """The last ``days`` bars as API rows, newest first"""
+        return self._rows(max(self.length - days, 0), self.length)
+
+    def iter_rows(self, days: int, chunk_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """The last ``days`` bars as API rows, newest first, ``chunk_size`` rows at a time"""
+        start, stop = max(self.length - days, 0), self.length
+        while stop > start:
+            lower = max(stop - chunk_size, start)
+            yield self._rows(lower, stop)
+            stop = lower
+
+    def _rows(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        dates = self._dates[start:stop][::-1].astype(str).tolist()
+        columns = [self._columns[name][start:stop][::-1].tolist() for name in PRICE_COLUMNS]
+        return [
+            {
+                "symbol": self.symbol,
+                "date": bar_date,
+                "open_price": _number(open_price),
+                "high_price": _number(high_price),
+                "low_price": _number(low_price),
+                "close_price": _number(close_price),
+                "volume": None if volume != volume else int(volume),
+            }
+            for bar_date, open_price, high_price, low_price, close_price, volume in zip(dates, *columns)
+        ]
+
+
+def _number(value: float) -> Optional[float]:
+    return None if value != value else value
+
+
+def resample_rows(symbol: str, rows: List[Dict[str, Any]], interval: str) -> List[Dict[str, Any]]:
+    """Resample daily API rows (newest first) to ``interval`` bars, newest first"""
+    if interval == "1d":
+        return rows
+    series = PriceSeries.from_rows(symbol, sorted(rows, key=lambda row: str(row["date"])))
+    resampled, bars = series.window(len(rows), interval)
+    return resampled.rows(bars)
+
+
+def series_from_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, PriceSeries]:
+    """Group price rows by symbol into date-sorted series"""
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        grouped.setdefault(row["symbol"], []).append(row)
+    series = {}
+    for symbol, symbol_rows in grouped.items():
+        symbol_rows.sort(key=lambda row: str(row["date"]))
+        series[symbol] = PriceSeries.from_rows(symbol, symbol_rows)
+    return series
+
+
+class PriceStore:
+    """Process-resident columnar copy of one price table (stock_prices or etf_prices)
+
+    With ``shared_dir`` set, the table lives once per host in a
+    ``SharedPriceSegment`` instead: one worker loads it from the database and
+    publishes it, the others map the published generation, and every worker
+    re-maps whenever the generation counter moves. Posted bars are served by
+    the worker that took them at once and, every ``publish_interval``
+    seconds, folded in one batch into the latest generation and republished
+    under the host lock, so no worker's bars are lost to another's and a
+    burst of writes costs one rewrite of the table.
+    """
+
+    def __init__(self, table: str, loader: Callable[..., Awaitable[List[Dict[str, Any]]]],
+                 refresh_interval: float = PRICE_STORE_REFRESH, shared_dir: str = PRICE_STORE_SHARED_DIR,
+                 publish_interval: float = PRICE_STORE_PUBLISH_INTERVAL):
+        self.table = table
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.shared_dir = shared_dir
+        self.publish_interval = publish_interval
+        self.series: Dict[str, PriceSeries] = {}
+        self.loaded_at: Optional[float] = None
+        # Shared segment generation (and its wall-clock publish time) the series view
+        self.generation = 0
+        self.published_at: Optional[float] = None
+        # Wall-clock time of the last out-of-process write; older segments are reloaded
+        self.valid_after = 0.0
+        # Symbols another process wrote, re-read on next use (process-local stores only)
+        self.dirty: Set[str] = set()
+        self._segment: Optional[SharedPriceSegment] = None
+        self._reload: Optional[asyncio.Task] = None
+        # Bars posted to this worker and not yet in the shared segment (waiting, and being published)
+        self._unpublished: List[Dict[str, Any]] = []
+        self._publishing: List[Dict[str, Any]] = []
+        self._publisher: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def segment(self) -> Optional[SharedPriceSegment]:
+        """The host-wide segment, opened on first use (None when the store is process-local)"""
+        if self._segment is None and self.shared_dir:
+            try:
+                self._segment = SharedPriceSegment(self.shared_dir, self.table, PRICE_COLUMNS)
+            except (OSError, RuntimeError) as e:
+                logger.warning("Keeping %s in process memory, no shared segment: %s", self.table, e)
+                self.shared_dir = ""
+        return self._segment
+
+    async def ensure_loaded(self) -> bool:
+        """Load (or periodically reload) the table; False if it is unavailable"""
+        if self._fresh():
+            return True
+        async with self._lock:
+            if self._fresh():
+                return True
+            try:
+                if self.segment is not None:
+                    await self._sync()
+                elif self.dirty and self.loaded_at is not None:
+                    await self._refresh()
+                else:
+                    self.load(await self.loader())
+            except Exception as e:
+                metrics.dataset_errors.inc(self.table)
+                logger.warning("Could not load %s into the price store: %s", self.table, e)
+                return self.loaded_at is not None
+        return True
+
+    def _fresh(self) -> bool:
+        if self.loaded_at is None:
+            return False
+        if self.segment is not None:
+            return self.generation == self.segment.generation() and not self._stale(self.published_at)
+        return not self.dirty and time.monotonic() - self.loaded_at < self.refresh_interval
+
+    def _stale(self, published_at: Optional[float]) -> bool:
+        return (published_at is None or published_at <= self.valid_after
+                or time.time() - published_at >= self.refresh_interval)
+
+    def invalidate(self, table: str, symbols: Optional[FrozenSet[str]] = None):
+        """Re-read ``symbols`` (or, when None, the whole table) on next use after another process wrote them"""
+        if symbols is None:
+            self.valid_after = time.time()
+            self.loaded_at = None
+        elif not self.shared_dir:
+            self.dirty.update(symbols)
+        # Bars posted to another worker of a shared store: it republished, and the generation moved
+
+    async def _refresh(self):
+        """Replace just the dirty symbols' series with their rows in the database"""
+        symbols = sorted(self.dirty)
+        series = series_from_rows(await self.loader(symbols))
+        self.dirty.difference_update(symbols)
+        for symbol in symbols:
+            if symbol in series:
+                self.series[symbol] = series[symbol]
+            else:
+                self.series.pop(symbol, None)
+            versions.bump(self.table, symbol)
+
+    async def _sync(self):
+        """Map the latest shared generation, reloading it from the database first when it is stale"""
+        latest = self.segment.open()
+        if latest is not None and not self._stale(latest.published_at):
+            if latest.generation != self.generation:
+                self._attach(latest)
+            return
+        # A request that times out must not abandon the reload halfway through the host lock
+        if self._reload is None or self._reload.done():
+            self._reload = asyncio.ensure_future(self._reload_shared())
+        await asyncio.shield(self._reload)
+
+    async def _reload_shared(self):
+        # One worker per host reloads; the others wait on the lock and map its result
+        segment = self.segment
+        async with segment.locked():
+            latest = segment.open()
+            if latest is None or self._stale(latest.published_at):
+                await asyncio.to_thread(segment.publish, series_from_rows(await self.loader()))
+                latest = segment.open()
+            self._attach(latest)
+
+    def _attach(self, segment: Segment, changed: bool = True):
+        """Serve from ``segment``'s arrays; ``changed=False`` when it holds what this process already had"""
+        self.series = _views(segment)
+        # Bars posted here that the segment does not hold yet stay visible
+        _upsert_rows(self.series, self._publishing + self._unpublished)
+        self.generation = segment.generation
+        self.published_at = segment.published_at
+        if changed:
+            self.loaded_at = time.monotonic()
+            versions.bump(self.table)
+
+    def load(self, rows: Iterable[Dict[str, Any]]):
+        self.series = series_from_rows(rows)
+        self.dirty.clear()
+        self.loaded_at = time.monotonic()
+        versions.bump(self.table)
+
+    async def append(self, rows: Iterable[Dict[str, Any]]):
+        """Apply newly written bars (and queue them for the other workers when shared)"""
+        rows = list(rows)
+        self._apply(rows)
+        if self.segment is None:
+            return
+        self._unpublished.extend(rows)
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.ensure_future(self._publish_pending())
+
+    async def flush(self):
+        """Wait until every bar posted to this worker is in the shared segment"""
+        if self._publisher is not None:
+            await self._publisher
+
+    async def _publish_pending(self):
+        """Republish the shared table once per batch of posted bars"""
+        while self._unpublished:
+            await asyncio.sleep(self.publish_interval)
+            self._publishing, self._unpublished = self._unpublished, []
+            try:
+                replaced, latest = await asyncio.to_thread(self._merge_publish, self._publishing)
+            except Exception as e:
+                # The bars are in the database: other workers pick them up on their next reload
+                metrics.dataset_errors.inc(self.table)
+                logger.warning("Could not publish %d %s bars to the shared segment: %s",
+                               len(self._publishing), self.table, e)
+                latest = None
+            self._publishing = []
+            # None before the first publish: the first load from the database includes the bars
+            if latest is not None:
+                # Unchanged unless another worker published in between; drops the private copies
+                self._attach(latest, changed=replaced != self.generation)
+
+    def _merge_publish(self, rows: List[Dict[str, Any]]) -> Tuple[int, Optional[Segment]]:
+        """Publish the latest generation plus ``rows``; returns (generation replaced, new segment)
+
+        Runs in a worker thread and holds the host lock only inside it, so it
+        cannot be left locked by a cancelled await.
+        """
+        segment = self.segment
+        segment.acquire()
+        try:
+            latest = segment.open()
+            if latest is None:
+                return 0, None
+            series = _views(latest)
+            _upsert_rows(series, rows)
+            segment.publish(series)
+            return latest.generation, segment.open()
+        finally:
+            segment.release()
+
+    def _apply(self, rows: Iterable[Dict[str, Any]]):
+        for symbol in _upsert_rows(self.series, rows):
+            versions.bump(self.table, symbol)
+
+    def get(self, symbol: str) -> Optional[PriceSeries]:
+        return self.series.get(symbol.upper())
+
+    def history(self, symbol: str, days: int = 30, interval: str = "1d") -> List[Dict[str, Any]]:
+        series = self.get(symbol)
+        if series is None:
+            return []
+        series, bars = series.window(days, interval)
+        return series.rows(bars)
+
+
+def _views(segment: Segment) -> Dict[str, PriceSeries]:
+    """Series viewing each symbol's slice of a shared segment"""
+    offsets = segment.offsets.tolist()
+    return {
+        symbol: PriceSeries.view(symbol, segment.dates[start:stop],
+                                 {name: column[start:stop] for name, column in segment.columns.items()})
+        for symbol, start, stop in zip(segment.symbols, offsets, offsets[1:])
+    }
+
+
+def _upsert_rows(series: Dict[str, PriceSeries], rows: Iterable[Dict[str, Any]]) -> List[str]:
+    """Write ``rows`` into ``symbol -> PriceSeries``; returns the symbol of each row"""
+    symbols = []
+    for row in rows:
+        symbol = row["symbol"].upper()
+        if symbol not in series:
+            series[symbol] = PriceSeries(symbol)
+        series[symbol].upsert(row)
+        symbols.append(symbol)
+    return symbols
+
+
+# Global instances (this process's own writes are applied by append)
+stock_price_store = PriceStore('stock_prices', lambda symbols=None: repository.get_all_prices('stock_prices', symbols))
+etf_price_store = PriceStore('etf_prices', lambda symbols=None: repository.get_all_prices('etf_prices', symbols))
+bus.subscribe(("stock_prices",), stock_price_store.invalidate, remote_only=True)
+bus.subscribe(("etf_prices",), etf_price_store.invalidate, remote_only=True)
@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from invalidation import bus
+from repository import repository
+
+load_dotenv()
+
+# Seconds before the engine reloads from the database to pick up out-of-process writes
+RANKINGS_REFRESH = float(os.getenv("RANKINGS_REFRESH", "300"))
+
+# Written symbols past which a full reload is cheaper than re-reading each
+MAX_DIRTY_SYMBOLS = 200
+
+
+class _BoundedHeap:
+    """The ``capacity`` largest (key, symbol) pairs, kept as a min-heap"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.heap: List[Tuple[float, str]] = []
+        self.members: Dict[str, float] = {}
+
+    def rebuild(self, keys: Dict[str, float]):
+        self.heap = heapq.nlargest(self.capacity, ((key, symbol) for symbol, key in keys.items()))
+        heapq.heapify(self.heap)
+        self.members = {symbol: key for key, symbol in self.heap}
+
+    def update(self, symbol: str, key: float, universe: int) -> bool:
+        """Apply a new key for ``symbol``; returns True when a rebuild is required"""
+        old = self.members.get(symbol)
+        if old is not None:
+            if key >= old or universe <= self.capacity:
+                # Moving up (or nothing outside the heap): replace in place
+                self.heap.remove((old, symbol))
+                self.heap.append((key, symbol))
+                heapq.heapify(self.heap)
+                self.members[symbol] = key
+                return False
+            # Moving down: a symbol outside the heap may now outrank it
+            return True
+
+        if len(self.heap) < self.capacity:
+            heapq.heappush(self.heap, (key, symbol))
+            self.members[symbol] = key
+        elif key > self.heap[0][0]:
+            _, evicted = heapq.heapreplace(self.heap, (key, symbol))
+            del self.members[evicted]
+            self.members[symbol] = key
+        return False
+
+    def largest(self, limit: int) -> List[Tuple[float, str]]:
+        return heapq.nlargest(limit, self.heap)
+
+
+class RankingEngine:
+    """Daily percent change per symbol with top-K and bottom-K heaps
+
+    Only the last two bars of each symbol are kept. When a bar is written the
+    symbol's change is recomputed and both heaps are updated in O(K); gainers
+    and losers are then served straight from memory.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]],
+                 capacity: int = 100, refresh_interval: float = RANKINGS_REFRESH,
+                 symbols_loader: Optional[Callable[[List[str]],
+                                                   Awaitable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]]] = None):
+        self.loader = loader
+        self.symbols_loader = symbols_loader
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+
+        self.bars: Dict[str, List[Tuple[str, float]]] = {}
+        self.changes: Dict[str, float] = {}
+        self.info: Dict[str, Dict[str, Any]] = {}
+        self._top = _BoundedHeap(capacity)
+        self._bottom = _BoundedHeap(capacity)
+
+        self.loaded_at: Optional[float] = None
+        # Symbols whose stock row, or bars written by another process, changed; re-read on next use
+        self.dirty: Set[str] = set()
+        self._lock = asyncio.Lock()
+
+    async def ensure_loaded(self):
+        if self._fresh() and not self.dirty:
+            return
+        async with self._lock:
+            if not self._fresh():
+                bars, stocks = await self.loader()
+                self.load(bars, stocks)
+            elif self.dirty:
+                await self._refresh()
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_interval
+
+    def invalidate(self, table: str, symbols: Optional[FrozenSet[str]] = None):
+        """Re-read ``symbols`` (or, when None, everything) on next use"""
+        if symbols is None or self.symbols_loader is None or len(self.dirty | symbols) > MAX_DIRTY_SYMBOLS:
+            self.loaded_at = None
+        else:
+            self.dirty.update(symbols)
+
+    async def _refresh(self):
+        """Replace the dirty symbols' stock info and bars with what the database holds"""
+        symbols = sorted(self.dirty)
+        bars, stocks = await self.symbols_loader(symbols)
+        self.dirty.difference_update(symbols)
+        self.info.update((stock["symbol"], stock) for stock in stocks)
+        for symbol in symbols:
+            self.bars.pop(symbol, None)
+            self.changes.pop(symbol, None)
+        for bar in bars:
+            self._record(bar)
+        for symbol in symbols:
+            change = self._change(symbol)
+            if change is not None:
+                self.changes[symbol] = change
+        self._rebuild()
+
+    def load(self, bars: Iterable[Dict[str, Any]], stocks: Iterable[Dict[str, Any]]):
+        """Rebuild from scratch from recent price rows and stock info"""
+        self.info = {stock["symbol"]: stock for stock in stocks}
+        self.bars = {}
+        for bar in bars:
+            self._record(bar)
+        self.changes = {}
+        for symbol in self.bars:
+            change = self._change(symbol)
+            if change is not None:
+                self.changes[symbol] = change
+        self._rebuild()
+        self.dirty.clear()
+        self.loaded_at = time.monotonic()
+
+    def apply_bars(self, bars: Iterable[Dict[str, Any]]):
+        """Fold newly written price bars into the rankings"""
+        rebuild = False
+        for bar in bars:
+            symbol = bar["symbol"]
+            self._record(bar)
+            change = self._change(symbol)
+            if change is None:
+                continue
+            self.changes[symbol] = change
+            universe = len(self.changes)
+            rebuild |= self._top.update(symbol, change, universe)
+            rebuild |= self._bottom.update(symbol, -change, universe)
+        if rebuild:
+            self._rebuild()
+
+    def gainers(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return [self._row(symbol) for _, symbol in self._ranked(self._top, limit, reverse=True)]
+
+    def losers(self, limit: int = 10) -> List[Dict[str, Any]]:
+        return [self._row(symbol) for _, symbol in self._ranked(self._bottom, limit, reverse=False)]
+
+    def _ranked(self, side: _BoundedHeap, limit: int, reverse: bool) -> List[Tuple[float, str]]:
+        if limit <= self.capacity:
+            return side.largest(limit)
+        # Beyond the heap capacity fall back to a full sort
+        ordered = sorted(self.changes.items(), key=lambda item: item[1], reverse=reverse)[:limit]
+        return [(change, symbol) for symbol, change in ordered]
+
+    def _record(self, bar: Dict[str, Any]):
+        if bar.get("close_price") is None:
+            return
+        symbol, bar_date, close = bar["symbol"], str(bar["date"]), float(bar["close_price"])
+        recent = [b for b in self.bars.get(symbol, []) if b[0] != bar_date]
+        recent.append((bar_date, close))
+        recent.sort()
+        self.bars[symbol] = recent[-2:]
+
+    def _change(self, symbol: str) -> Optional[float]:
+        recent = self.bars.get(symbol, [])
+        if len(recent) < 2 or not recent[0][1]:
+            return None
+        return (recent[1][1] - recent[0][1]) / recent[0][1] * 100
+
+    def _rebuild(self):
+        self._top.rebuild(self.changes)
+        self._bottom.rebuild({symbol: -change for symbol, change in self.changes.items()})
+
+    def _row(self, symbol: str) -> Dict[str, Any]:
+        (_, previous_close), (latest_date, close) = self.bars[symbol]
+        info = self.info.get(symbol, {})
+        return {
+            "symbol": symbol,
+            "name": info.get("name"),
+            "sector": info.get("sector"),
+            "date": latest_date,
+            "close_price": close,
+            "previous_close": previous_close,
+            "change": round(close - previous_close, 4),
+            "change_percent": round(self.changes[symbol], 4),
+        }
+
+
+async def _load_from_repository():
+    return await asyncio.gather(
+        repository.get_recent_stock_prices(2),
+        repository.get_stocks('symbol, name, sector'),
+    )
+
+
+async def _load_symbols_from_repository(symbols: List[str]):
+    return await asyncio.gather(
+        repository.get_recent_stock_prices(2, symbols),
+        repository.get_stocks_by_symbols(symbols),
+    )
+
+
+# Global instance (this process's own bars are applied by apply_bars)
+ranking_engine = RankingEngine(_load_from_repository, symbols_loader=_load_symbols_from_repository)
+bus.subscribe(("stocks",), ranking_engine.invalidate)
+bus.subscribe(("stock_prices",), ranking_engine.invalidate, remote_only=True)
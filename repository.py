@@ -0,0 +1,814 @@
+import asyncio
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+import metrics
+
+if TYPE_CHECKING:
+    from database import Database
+    from supabase_db import SupabaseDB
+
+load_dotenv()
+
+# Seconds a composite endpoint waits on an optional sub-query before returning null
+SUBQUERY_TIMEOUT = float(os.getenv("SUBQUERY_TIMEOUT", "2.0"))
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+PRICE_TABLES = ('stock_prices', 'etf_prices')
+
+SNAPSHOT_JSON_COLUMNS = ('latest_price', 'fundamentals', 'technical_indicators')
+
+# Invalidation log rows kept; older ones are deleted as new ones are recorded
+MAX_INVALIDATIONS = 10000
+
+# UNIQUE key of every table, used as the conflict target of bulk upserts
+UNIQUE_KEYS = {
+    'sectors': ('name',),
+    'stocks': ('symbol',),
+    'stock_prices': ('symbol', 'date'),
+    'fundamentals': ('symbol', 'quarter', 'year'),
+    'technical_indicators': ('symbol', 'date'),
+    'etfs': ('symbol',),
+    'etf_prices': ('symbol', 'date'),
+    'etf_holdings': ('etf_symbol', 'stock_symbol'),
+}
+
+
+def _unique_key(table: str) -> Sequence[str]:
+    if table not in UNIQUE_KEYS:
+        raise ValueError(f"Unknown table: {table!r}")
+    return UNIQUE_KEYS[table]
+
+
+class Repository(ABC):
+    """Backend-agnostic data access interface used by the API
+
+    Every method returns plain rows (dicts) or ``None``, so handlers do not care
+    whether the data comes from Supabase or a local SQLite file.
+    """
+
+    def connect(self):
+        """Open connections ahead of the first query (backends that connect on construction need nothing)"""
+
+    # Stocks
+    @abstractmethod
+    def get_stock(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Stock row by symbol"""
+
+    @abstractmethod
+    def get_stocks(self, columns: str = '*', limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """All stocks, optionally projected to ``columns`` and capped at ``limit``"""
+
+    @abstractmethod
+    def insert_stock(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a stock and return the stored row (including ``id``)"""
+
+    @abstractmethod
+    def get_stock_prices(self, symbol: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Most recent ``days`` price bars, newest first"""
+
+    @abstractmethod
+    def get_recent_stock_prices(self, bars: int = 2, symbols: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """The latest ``bars`` price bars of every symbol (or of just ``symbols``), newest first per symbol"""
+
+    @abstractmethod
+    def upsert_stock_prices(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """Insert or update price bars on (symbol, date); returns rows written"""
+
+    @abstractmethod
+    def get_all_prices(self, table: str, symbols: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Every bar of a price table (stock_prices or etf_prices), or of just ``symbols``, ordered by symbol and date"""
+
+    @abstractmethod
+    def get_price_page(self, table: str, symbol: str, before: Optional[str] = None,
+                       limit: int = 500) -> List[Dict[str, Any]]:
+        """Up to ``limit`` bars of ``symbol`` dated before ``before`` (keyset paging), newest first"""
+
+    @abstractmethod
+    def get_latest_fundamentals(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Most recent fundamentals row by year and quarter"""
+
+    @abstractmethod
+    def get_all_latest_fundamentals(self) -> List[Dict[str, Any]]:
+        """The most recent fundamentals row of every symbol"""
+
+    @abstractmethod
+    def get_latest_technical_indicators(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """Most recent technical indicators row"""
+
+    @abstractmethod
+    def get_stock_etfs(self, symbol: str) -> List[Dict[str, Any]]:
+        """Holdings of ``symbol`` across ETFs with embedded ``etfs(name, category)``"""
+
+    @abstractmethod
+    def get_sector_stocks(self, sector_name: str) -> List[Dict[str, Any]]:
+        """Stocks in a sector by market cap"""
+
+    # Sectors
+    @abstractmethod
+    def get_sectors(self) -> List[Dict[str, Any]]:
+        """All sectors by 1 day performance"""
+
+    @abstractmethod
+    def get_top_sectors(self, order_by: str, limit: int) -> List[Dict[str, Any]]:
+        """Top ``limit`` sectors by the ``order_by`` performance column"""
+
+    # ETFs
+    @abstractmethod
+    def get_etf(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """ETF row by symbol"""
+
+    @abstractmethod
+    def get_etfs(self) -> List[Dict[str, Any]]:
+        """All ETFs by AUM"""
+
+    @abstractmethod
+    def get_etfs_by_category(self, category: str) -> List[Dict[str, Any]]:
+        """ETFs in a category by AUM"""
+
+    @abstractmethod
+    def get_leveraged_etfs(self) -> List[Dict[str, Any]]:
+        """ETFs with leverage_ratio above 1 by AUM"""
+
+    @abstractmethod
+    def get_etf_prices(self, symbol: str, days: int = 30) -> List[Dict[str, Any]]:
+        """Most recent ``days`` ETF price bars, newest first"""
+
+    @abstractmethod
+    def upsert_etf_prices(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """Insert or update ETF price bars on (symbol, date); returns rows written"""
+
+    @abstractmethod
+    def get_etf_holdings(self, symbol: str, limit: int = 50,
+                         stock_fields: Sequence[str] = ('name', 'sector')) -> List[Dict[str, Any]]:
+        """Top holdings by weight with embedded ``stocks(<stock_fields>)``"""
+
+    @abstractmethod
+    def get_all_holdings(self) -> List[Dict[str, Any]]:
+        """Every etf_holdings row, ordered by ETF then heaviest first"""
+
+    # Latest snapshots, kept current on write by database triggers
+    @abstractmethod
+    def get_snapshot(self, kind: str, symbol: str) -> Optional[Dict[str, Any]]:
+        """The latest_snapshots row of a ``stock`` or ``etf``: latest_price, previous_close, fundamentals, technical_indicators"""
+
+    @abstractmethod
+    def get_snapshots(self, kind: str) -> List[Dict[str, Any]]:
+        """Every latest_snapshots row of ``kind`` (``stock`` or ``etf``)"""
+
+    # Batch (multi-symbol) reads: one ``IN`` query per table
+    @abstractmethod
+    def get_stocks_by_symbols(self, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        """Stock rows for ``symbols`` (unknown symbols are skipped)"""
+
+    @abstractmethod
+    def get_etfs_by_symbols(self, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        """ETF rows for ``symbols`` (unknown symbols are skipped)"""
+
+    @abstractmethod
+    def get_snapshots_by_symbols(self, kind: str, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        """The latest_snapshots rows of ``kind`` for ``symbols`` (symbols without one are skipped)"""
+
+    @abstractmethod
+    def get_price_histories(self, table: str, symbols: Sequence[str], days: int = 30) -> List[Dict[str, Any]]:
+        """The latest ``days`` bars of each of ``symbols``, ordered by symbol then date descending"""
+
+    # Bulk loading
+    @abstractmethod
+    def upsert_rows(self, table: str, rows: Sequence[Dict[str, Any]]) -> int:
+        """Insert or update rows on the table's UNIQUE key; returns rows written"""
+
+    @abstractmethod
+    def clear_table(self, table: str):
+        """Delete every row of ``table``"""
+
+    # Invalidation log: writes announced to every process serving the database
+    @abstractmethod
+    def record_invalidation(self, origin: str, table_name: str, symbols: Optional[Sequence[str]] = None):
+        """Append a write to ``table_name`` (``symbols=None``: any row) made by ``origin``"""
+
+    @abstractmethod
+    def get_invalidations(self, after_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Invalidation rows with an id above ``after_id``, oldest first"""
+
+    @abstractmethod
+    def last_invalidation_id(self) -> int:
+        """Id of the newest invalidation row (0 when there is none)"""
+
+
+class SupabaseRepository(Repository):
+    """Queries against Supabase through the PostgREST client"""
+
+    def __init__(self, db: "SupabaseDB"):
+        self.db = db
+
+    @property
+    def client(self):
+        return self.db.supabase
+
+    def connect(self):
+        # Creating the client imports supabase and reads the credentials
+        self.client
+
+    # Stocks
+    def get_stock(self, symbol: str) -> Optional[Dict[str, Any]]:
+        result = self.db.get_stock(symbol)
+        return result.data[0] if result.data else None
+
+    def get_stocks(self, columns: str = '*', limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        # PostgREST silently caps an unpaged select at its max-rows (1000 by default)
+        rows = self._fetch_all(lambda: self.client.table('stocks').select(columns).order('symbol'))
+        return rows if limit is None else rows[:limit]
+
+    def insert_stock(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.db.insert_stock(stock_data).data[0]
+
+    def get_stock_prices(self, symbol: str, days: int = 30) -> List[Dict[str, Any]]:
+        return self.db.get_stock_prices(symbol, days).data
+
+    def get_recent_stock_prices(self, bars: int = 2, symbols: Optional[Sequence[str]] = None,
+                                lookback_days: int = 14) -> List[Dict[str, Any]]:
+        # PostgREST has no window functions: read a short trailing window of
+        # dates and keep the newest ``bars`` rows of each symbol
+        def select(columns: str):
+            query = self.client.table('stock_prices').select(columns)
+            return query.in_('symbol', _upper(symbols)) if symbols is not None else query
+
+        latest = select('date').order('date', desc=True).limit(1).execute().data
+        if not latest:
+            return []
+        since = (date.fromisoformat(latest[0]['date']) - timedelta(days=lookback_days)).isoformat()
+        rows = self._fetch_all(lambda: select('*').gte('date', since).order('symbol').order('date', desc=True))
+
+        recent, counts = [], {}
+        for row in rows:
+            seen = counts.get(row['symbol'], 0)
+            if seen < bars:
+                recent.append(row)
+                counts[row['symbol']] = seen + 1
+        return recent
+
+    def upsert_stock_prices(self, rows: Sequence[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        return len(self.client.table('stock_prices').upsert(list(rows), on_conflict='symbol,date').execute().data)
+
+    def get_all_prices(self, table: str, symbols: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        if table not in PRICE_TABLES:
+            raise ValueError(f"Unknown price table: {table!r}")
+        columns = 'symbol, date, open_price, high_price, low_price, close_price, volume'
+
+        def build_query():
+            query = self.client.table(table).select(columns)
+            if symbols is not None:
+                query = query.in_('symbol', [symbol.upper() for symbol in symbols])
+            return query.order('symbol').order('date')
+
+        return self._fetch_all(build_query)
+
+    def get_price_page(self, table: str, symbol: str, before: Optional[str] = None,
+                       limit: int = 500) -> List[Dict[str, Any]]:
+        if table not in PRICE_TABLES:
+            raise ValueError(f"Unknown price table: {table!r}")
+        columns = 'symbol, date, open_price, high_price, low_price, close_price, volume'
+        query = self.client.table(table).select(columns).eq('symbol', symbol.upper())
+        if before is not None:
+            query = query.lt('date', before)
+        return query.order('date', desc=True).limit(limit).execute().data
+
+    def _fetch_all(self, build_query: Callable[[], Any], page_size: int = 1000) -> List[Dict[str, Any]]:
+        """Read every row of a query, one ``range`` page at a time"""
+        rows, offset = [], 0
+        while True:
+            page = build_query().range(offset, offset + page_size - 1).execute().data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            offset += page_size
+
+    def get_latest_fundamentals(self, symbol: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table('fundamentals').select('*').eq('symbol', symbol.upper()).order('year', desc=True).order('quarter', desc=True).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    def get_all_latest_fundamentals(self) -> List[Dict[str, Any]]:
+        rows = self._fetch_all(lambda: self.client.table('fundamentals').select('*').order('symbol').order('year', desc=True).order('quarter', desc=True))
+        latest = {}
+        for row in rows:
+            latest.setdefault(row['symbol'], row)
+        return list(latest.values())
+
+    def get_latest_technical_indicators(self, symbol: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table('technical_indicators').select('*').eq('symbol', symbol.upper()).order('date', desc=True).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    def get_stock_etfs(self, symbol: str) -> List[Dict[str, Any]]:
+        return self.client.table('etf_holdings').select('*, etfs(name, category)').eq('stock_symbol', symbol.upper()).order('weight_percentage', desc=True).execute().data
+
+    def get_sector_stocks(self, sector_name: str) -> List[Dict[str, Any]]:
+        return self.client.table('stocks').select('*').eq('sector', sector_name).order('market_cap', desc=True).execute().data
+
+    # Sectors
+    def get_sectors(self) -> List[Dict[str, Any]]:
+        return self.db.get_sectors().data
+
+    def get_top_sectors(self, order_by: str, limit: int) -> List[Dict[str, Any]]:
+        return self.client.table('sectors').select('*').order(order_by, desc=True).limit(limit).execute().data
+
+    # ETFs
+    def get_etf(self, symbol: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table('etfs').select('*').eq('symbol', symbol.upper()).execute()
+        return result.data[0] if result.data else None
+
+    def get_etfs(self) -> List[Dict[str, Any]]:
+        return self._fetch_all(lambda: self.client.table('etfs').select('*').order('aum', desc=True).order('symbol'))
+
+    def get_etfs_by_category(self, category: str) -> List[Dict[str, Any]]:
+        return self.client.table('etfs').select('*').eq('category', category).order('aum', desc=True).execute().data
+
+    def get_leveraged_etfs(self) -> List[Dict[str, Any]]:
+        return self.client.table('etfs').select('*').gt('leverage_ratio', 1.0).order('aum', desc=True).execute().data
+
+    def get_etf_prices(self, symbol: str, days: int = 30) -> List[Dict[str, Any]]:
+        return self.client.table('etf_prices').select('*').eq('symbol', symbol.upper()).order('date', desc=True).limit(days).execute().data
+
+    def upsert_etf_prices(self, rows: Sequence[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        return len(self.client.table('etf_prices').upsert(list(rows), on_conflict='symbol,date').execute().data)
+
+    def get_etf_holdings(self, symbol: str, limit: int = 50,
+                         stock_fields: Sequence[str] = ('name', 'sector')) -> List[Dict[str, Any]]:
+        columns = f"*, stocks({', '.join(stock_fields)})"
+        return self.client.table('etf_holdings').select(columns).eq('etf_symbol', symbol.upper()).order('weight_percentage', desc=True).limit(limit).execute().data
+
+    def get_all_holdings(self) -> List[Dict[str, Any]]:
+        return self._fetch_all(lambda: self.client.table('etf_holdings').select('*').order('etf_symbol').order('weight_percentage', desc=True).order('stock_symbol'))
+
+    # Latest snapshots
+    def get_snapshot(self, kind: str, symbol: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table('latest_snapshots').select('*').eq('kind', kind).eq('symbol', symbol.upper()).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    def get_snapshots(self, kind: str) -> List[Dict[str, Any]]:
+        return self._fetch_all(lambda: self.client.table('latest_snapshots').select('*').eq('kind', kind).order('symbol'))
+
+    # Batch (multi-symbol) reads
+    def get_stocks_by_symbols(self, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        return self.client.table('stocks').select('*').in_('symbol', _upper(symbols)).execute().data
+
+    def get_etfs_by_symbols(self, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        return self.client.table('etfs').select('*').in_('symbol', _upper(symbols)).execute().data
+
+    def get_snapshots_by_symbols(self, kind: str, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        return self.client.table('latest_snapshots').select('*').eq('kind', kind).in_('symbol', _upper(symbols)).execute().data
+
+    def get_price_histories(self, table: str, symbols: Sequence[str], days: int = 30,
+                            lookback_days: int = 14) -> List[Dict[str, Any]]:
+        if table not in PRICE_TABLES:
+            raise ValueError(f"Unknown price table: {table!r}")
+        # No window functions here either: read a calendar window wide enough
+        # for ``days`` bars and trim each symbol to its newest ``days`` rows
+        symbols = _upper(symbols)
+        latest = self.client.table(table).select('date').in_('symbol', symbols).order('date', desc=True).limit(1).execute().data
+        if not latest:
+            return []
+        since = (date.fromisoformat(latest[0]['date']) - timedelta(days=days * 2 + lookback_days)).isoformat()
+        columns = 'symbol, date, open_price, high_price, low_price, close_price, volume'
+        rows = self._fetch_all(lambda: self.client.table(table).select(columns).in_('symbol', symbols).gte('date', since).order('symbol').order('date', desc=True))
+
+        recent, counts = [], {}
+        for row in rows:
+            seen = counts.get(row['symbol'], 0)
+            if seen < days:
+                recent.append(row)
+                counts[row['symbol']] = seen + 1
+        return recent
+
+    # Bulk loading
+    def upsert_rows(self, table: str, rows: Sequence[Dict[str, Any]]) -> int:
+        conflict = ','.join(_unique_key(table))
+        if not rows:
+            return 0
+        return len(self.client.table(table).upsert(list(rows), on_conflict=conflict).execute().data)
+
+    def clear_table(self, table: str):
+        _unique_key(table)
+        self.client.table(table).delete().neq('id', 0).execute()
+
+    # Invalidation log
+    def record_invalidation(self, origin: str, table_name: str, symbols: Optional[Sequence[str]] = None):
+        row = self.client.table('invalidations').insert({
+            'origin': origin,
+            'table_name': table_name,
+            'symbols': ','.join(_upper(symbols)) if symbols is not None else None,
+        }).execute().data[0]
+        if row['id'] > MAX_INVALIDATIONS:
+            self.client.table('invalidations').delete().lte('id', row['id'] - MAX_INVALIDATIONS).execute()
+
+    def get_invalidations(self, after_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        return self.client.table('invalidations').select('*').gt('id', after_id).order('id').limit(limit).execute().data
+
+    def last_invalidation_id(self) -> int:
+        rows = self.client.table('invalidations').select('id').order('id', desc=True).limit(1).execute().data
+        return rows[0]['id'] if rows else 0
+
+
+def _check_identifiers(names: Sequence[str]) -> List[str]:
+    names = [name.strip() for name in names]
+    for name in names:
+        if name != '*' and not _IDENTIFIER.match(name):
+            raise ValueError(f"Invalid column name: {name!r}")
+    return names
+
+
+def _upper(symbols: Sequence[str]) -> List[str]:
+    return [symbol.upper() for symbol in symbols]
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ", ".join("?" for _ in values) or "NULL"
+
+
+def _embed(row: Dict[str, Any], key: str, fields: Sequence[str]) -> Dict[str, Any]:
+    """Fold ``<key>_<field>`` join columns into a nested dict like PostgREST embedding"""
+    embedded = {field: row.pop(f"{key}_{field}") for field in fields}
+    row[key] = embedded if any(value is not None for value in embedded.values()) else None
+    return row
+
+
+def _decode_snapshot(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse the JSON columns SQLite stores as text (PostgREST returns jsonb already decoded)"""
+    for column in SNAPSHOT_JSON_COLUMNS:
+        if row.get(column) is not None:
+            row[column] = json.loads(row[column])
+    return row
+
+
+class SQLiteRepository(Repository):
+    """Queries against a local SQLite file through ``database.Database``"""
+
+    def __init__(self, db: "Database"):
+        self.db = db
+
+    # Stocks
+    def get_stock(self, symbol: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.execute_query("SELECT * FROM stocks WHERE symbol = ?", (symbol.upper(),))
+        return rows[0] if rows else None
+
+    def get_stocks(self, columns: str = '*', limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = f"SELECT {', '.join(_check_identifiers(columns.split(',')))} FROM stocks"
+        if limit is not None:
+            return self.db.execute_query(query + " LIMIT ?", (limit,))
+        return self.db.execute_query(query)
+
+    def insert_stock(self, stock_data: Dict[str, Any]) -> Dict[str, Any]:
+        columns = _check_identifiers(list(stock_data))
+        placeholders = ", ".join("?" for _ in columns)
+        row_id = self.db.execute_insert(
+            f"INSERT INTO stocks ({', '.join(columns)}) VALUES ({placeholders})",
+            tuple(stock_data.values())
+        )
+        return {"id": row_id, **stock_data}
+
+    def get_stock_prices(self, symbol: str, days: int = 30) -> List[Dict[str, Any]]:
+        return self.db.execute_query(
+            "SELECT * FROM stock_prices WHERE symbol = ? ORDER BY date DESC LIMIT ?",
+            (symbol.upper(), days)
+        )
+
+    def get_recent_stock_prices(self, bars: int = 2, symbols: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        where, params = "", ()
+        if symbols is not None:
+            symbols = _upper(symbols)
+            where, params = f"WHERE symbol IN ({_placeholders(symbols)})", tuple(symbols)
+        rows = self.db.execute_query(
+            f"""
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS bar_rank
+                FROM stock_prices {where}
+            ) WHERE bar_rank <= ? ORDER BY symbol, date DESC
+            """,
+            params + (bars,)
+        )
+        for row in rows:
+            del row['bar_rank']
+        return rows
+
+    def upsert_stock_prices(self, rows: Sequence[Dict[str, Any]]) -> int:
+        return self._upsert('stock_prices', rows, ('symbol', 'date'))
+
+    def get_all_prices(self, table: str, symbols: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        if table not in PRICE_TABLES:
+            raise ValueError(f"Unknown price table: {table!r}")
+        columns = "symbol, date, open_price, high_price, low_price, close_price, volume"
+        if symbols is None:
+            return self.db.execute_query(f"SELECT {columns} FROM {table} ORDER BY symbol, date")
+        symbols = [symbol.upper() for symbol in symbols]
+        return self.db.execute_query(
+            f"SELECT {columns} FROM {table} WHERE symbol IN ({_placeholders(symbols)}) ORDER BY symbol, date",
+            tuple(symbols)
+        )
+
+    def get_price_page(self, table: str, symbol: str, before: Optional[str] = None,
+                       limit: int = 500) -> List[Dict[str, Any]]:
+        if table not in PRICE_TABLES:
+            raise ValueError(f"Unknown price table: {table!r}")
+        return self.db.execute_query(
+            f"""
+            SELECT symbol, date, open_price, high_price, low_price, close_price, volume FROM {table}
+            WHERE symbol = ? AND date < ? ORDER BY date DESC LIMIT ?
+            """,
+            (symbol.upper(), before if before is not None else '9999-12-31', limit)
+        )
+
+    def _upsert(self, table: str, rows: Sequence[Dict[str, Any]], conflict: Sequence[str]) -> int:
+        """INSERT ... ON CONFLICT DO UPDATE for rows sharing the same keys"""
+        if not rows:
+            return 0
+        columns = _check_identifiers(list(rows[0]))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in conflict)
+        query = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT({', '.join(conflict)}) DO "
+            + (f"UPDATE SET {updates}" if updates else "NOTHING")
+        )
+        return self.db.execute_many(query, [tuple(row.get(column) for column in columns) for row in rows])
+
+    def get_latest_fundamentals(self, symbol: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.execute_query(
+            "SELECT * FROM fundamentals WHERE symbol = ? ORDER BY year DESC, quarter DESC LIMIT 1",
+            (symbol.upper(),)
+        )
+        return rows[0] if rows else None
+
+    def get_all_latest_fundamentals(self) -> List[Dict[str, Any]]:
+        rows = self.db.execute_query(
+            """
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY year DESC, quarter DESC) AS row_rank
+                FROM fundamentals
+            ) WHERE row_rank = 1
+            """
+        )
+        for row in rows:
+            del row['row_rank']
+        return rows
+
+    def get_latest_technical_indicators(self, symbol: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.execute_query(
+            "SELECT * FROM technical_indicators WHERE symbol = ? ORDER BY date DESC LIMIT 1",
+            (symbol.upper(),)
+        )
+        return rows[0] if rows else None
+
+    def get_stock_etfs(self, symbol: str) -> List[Dict[str, Any]]:
+        rows = self.db.execute_query(
+            """
+            SELECT h.*, e.name AS etfs_name, e.category AS etfs_category
+            FROM etf_holdings h LEFT JOIN etfs e ON e.symbol = h.etf_symbol
+            WHERE h.stock_symbol = ?
+            ORDER BY h.weight_percentage DESC
+            """,
+            (symbol.upper(),)
+        )
+        return [_embed(row, 'etfs', ('name', 'category')) for row in rows]
+
+    def get_sector_stocks(self, sector_name: str) -> List[Dict[str, Any]]:
+        return self.db.execute_query(
+            "SELECT * FROM stocks WHERE sector = ? ORDER BY market_cap DESC", (sector_name,)
+        )
+
+    # Sectors
+    def get_sectors(self) -> List[Dict[str, Any]]:
+        return self.db.execute_query("SELECT * FROM sectors ORDER BY performance_1d DESC")
+
+    def get_top_sectors(self, order_by: str, limit: int) -> List[Dict[str, Any]]:
+        order_by, = _check_identifiers([order_by])
+        return self.db.execute_query(f"SELECT * FROM sectors ORDER BY {order_by} DESC LIMIT ?", (limit,))
+
+    # ETFs
+    def get_etf(self, symbol: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.execute_query("SELECT * FROM etfs WHERE symbol = ?", (symbol.upper(),))
+        return rows[0] if rows else None
+
+    def get_etfs(self) -> List[Dict[str, Any]]:
+        return self.db.execute_query("SELECT * FROM etfs ORDER BY aum DESC")
+
+    def get_etfs_by_category(self, category: str) -> List[Dict[str, Any]]:
+        return self.db.execute_query("SELECT * FROM etfs WHERE category = ? ORDER BY aum DESC", (category,))
+
+    def get_leveraged_etfs(self) -> List[Dict[str, Any]]:
+        return self.db.execute_query("SELECT * FROM etfs WHERE leverage_ratio > 1.0 ORDER BY aum DESC")
+
+    def get_etf_prices(self, symbol: str, days: int = 30) -> List[Dict[str, Any]]:
+        return self.db.execute_query(
+            "SELECT * FROM etf_prices WHERE symbol = ? ORDER BY date DESC LIMIT ?",
+            (symbol.upper(), days)
+        )
+
+    def upsert_etf_prices(self, rows: Sequence[Dict[str, Any]]) -> int:
+        return self._upsert('etf_prices', rows, ('symbol', 'date'))
+
+    def get_etf_holdings(self, symbol: str, limit: int = 50,
+                         stock_fields: Sequence[str] = ('name', 'sector')) -> List[Dict[str, Any]]:
+        fields = _check_identifiers(stock_fields)
+        joined = ", ".join(f"s.{field} AS stocks_{field}" for field in fields)
+        rows = self.db.execute_query(
+            f"""
+            SELECT h.*, {joined}
+            FROM etf_holdings h LEFT JOIN stocks s ON s.symbol = h.stock_symbol
+            WHERE h.etf_symbol = ?
+            ORDER BY h.weight_percentage DESC
+            LIMIT ?
+            """,
+            (symbol.upper(), limit)
+        )
+        return [_embed(row, 'stocks', fields) for row in rows]
+
+    def get_all_holdings(self) -> List[Dict[str, Any]]:
+        return self.db.execute_query(
+            """
+            SELECT * FROM etf_holdings ORDER BY etf_symbol, weight_percentage DESC, stock_symbol
+            """
+        )
+
+    # Latest snapshots
+    def get_snapshot(self, kind: str, symbol: str) -> Optional[Dict[str, Any]]:
+        rows = self.db.execute_query(
+            "SELECT * FROM latest_snapshots WHERE kind = ? AND symbol = ?", (kind, symbol.upper())
+        )
+        return _decode_snapshot(rows[0]) if rows else None
+
+    def get_snapshots(self, kind: str) -> List[Dict[str, Any]]:
+        rows = self.db.execute_query("SELECT * FROM latest_snapshots WHERE kind = ? ORDER BY symbol", (kind,))
+        return [_decode_snapshot(row) for row in rows]
+
+    # Batch (multi-symbol) reads
+    def get_stocks_by_symbols(self, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        symbols = _upper(symbols)
+        return self.db.execute_query(f"SELECT * FROM stocks WHERE symbol IN ({_placeholders(symbols)})", tuple(symbols))
+
+    def get_etfs_by_symbols(self, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        symbols = _upper(symbols)
+        return self.db.execute_query(f"SELECT * FROM etfs WHERE symbol IN ({_placeholders(symbols)})", tuple(symbols))
+
+    def get_snapshots_by_symbols(self, kind: str, symbols: Sequence[str]) -> List[Dict[str, Any]]:
+        symbols = _upper(symbols)
+        rows = self.db.execute_query(
+            f"SELECT * FROM latest_snapshots WHERE kind = ? AND symbol IN ({_placeholders(symbols)})",
+            (kind, *symbols)
+        )
+        return [_decode_snapshot(row) for row in rows]
+
+    def get_price_histories(self, table: str, symbols: Sequence[str], days: int = 30) -> List[Dict[str, Any]]:
+        if table not in PRICE_TABLES:
+            raise ValueError(f"Unknown price table: {table!r}")
+        symbols = _upper(symbols)
+        return self.db.execute_query(
+            f"""
+            SELECT symbol, date, open_price, high_price, low_price, close_price, volume FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS bar_rank
+                FROM {table} WHERE symbol IN ({_placeholders(symbols)})
+            ) WHERE bar_rank <= ? ORDER BY symbol, date DESC
+            """,
+            (*symbols, days)
+        )
+
+    # Bulk loading
+    def upsert_rows(self, table: str, rows: Sequence[Dict[str, Any]]) -> int:
+        return self._upsert(table, rows, _unique_key(table))
+
+    def clear_table(self, table: str):
+        _unique_key(table)
+        self.db.execute_update(f"DELETE FROM {table}")
+
+    # Invalidation log
+    def record_invalidation(self, origin: str, table_name: str, symbols: Optional[Sequence[str]] = None):
+        row_id = self.db.execute_insert(
+            "INSERT INTO invalidations (origin, table_name, symbols) VALUES (?, ?, ?)",
+            (origin, table_name, ','.join(_upper(symbols)) if symbols is not None else None)
+        )
+        if row_id > MAX_INVALIDATIONS:
+            self.db.execute_update("DELETE FROM invalidations WHERE id <= ?", (row_id - MAX_INVALIDATIONS,))
+
+    def get_invalidations(self, after_id: int, limit: int = 1000) -> List[Dict[str, Any]]:
+        return self.db.execute_query(
+            "SELECT * FROM invalidations WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        )
+
+    def last_invalidation_id(self) -> int:
+        return self.db.execute_query("SELECT COALESCE(MAX(id), 0) AS id FROM invalidations")[0]['id']
+
+
+async def with_timeout(awaitable: Awaitable[Any], timeout: Optional[float] = None, default: Any = None) -> Any:
+    """Await a secondary lookup, degrading to ``default`` if it takes too long"""
+    try:
+        return await asyncio.wait_for(awaitable, timeout if timeout is not None else SUBQUERY_TIMEOUT)
+    except asyncio.TimeoutError:
+        return default
+
+
+class AsyncRepository:
+    """Awaitable facade that runs every repository call on a bounded thread pool
+
+    The Supabase client is synchronous, so calling it from an ``async def``
+    handler would block the event loop for the whole round trip. Each method of
+    the wrapped backend is exposed here as a coroutine executed on a dedicated
+    executor, which keeps the loop free while at most ``max_workers`` queries
+    are on the wire at once.
+
+    The backend is built by ``factory`` on first use (or by ``connect`` in the
+    app lifespan), on the executor, so importing this module opens nothing.
+    """
+
+    def __init__(self, factory: Callable[[], Repository], max_workers: int = 32):
+        self.factory = factory
+        self.backend: Optional[Repository] = None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+        self._connect_lock = threading.Lock()
+
+    async def connect(self) -> Repository:
+        """Build the backend and open its connections, if that has not happened yet"""
+        if self.backend is None:
+            await self.run(self._open)
+        return self.backend
+
+    def _open(self):
+        with self._connect_lock:
+            if self.backend is None:
+                backend = self.factory()
+                backend.connect()
+                self.backend = backend
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking callable on the database executor, recording its latency"""
+        return await self._timed(partial(func, *args, **kwargs), getattr(func, "__name__", "call"))
+
+    async def _timed(self, call: Callable[[], Any], operation: str, table: str = "") -> Any:
+        loop = asyncio.get_running_loop()
+        metrics.db_in_flight.inc()
+        start_time = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self.executor, call)
+        except Exception:
+            metrics.db_query_errors.inc(operation, table)
+            raise
+        finally:
+            metrics.db_query_duration.observe(time.perf_counter() - start_time, operation, table)
+            metrics.db_in_flight.dec()
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(Repository, name, None)):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        # Operations serving several tables (get_all_prices, upsert_rows, ...) take it as ``table``
+        parameters = list(inspect.signature(getattr(Repository, name)).parameters)[1:]
+        position = parameters.index("table") if "table" in parameters else None
+
+        async def call(*args, **kwargs):
+            backend = self.backend or await self.connect()
+            table = kwargs.get("table", args[position] if position is not None and position < len(args) else "")
+            return await self._timed(partial(getattr(backend, name), *args, **kwargs), name, str(table))
+
+        call.__name__ = name
+        call.__doc__ = getattr(Repository, name).__doc__
+        return call
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_repository(backend: Optional[str] = None) -> Repository:
+    """Build the storage backend selected by ``DB_BACKEND`` (supabase or sqlite)"""
+    backend = (backend or os.getenv("DB_BACKEND", "supabase")).lower()
+
+    if backend == "sqlite":
+        from database import Database
+        return SQLiteRepository(Database(
+            os.getenv("SQLITE_DB_PATH", "finstocks.db"),
+            profile=os.getenv("SQLITE_PRAGMA_PROFILE", "default"),
+            max_readers=int(os.getenv("SQLITE_READ_POOL_SIZE", "8")),
+        ))
+    if backend == "supabase":
+        from supabase_db import supabase_db
+        return SupabaseRepository(supabase_db)
+
+    raise ValueError(f"Unknown DB_BACKEND '{backend}', expected 'supabase' or 'sqlite'")
+
+
+# Global instance (the backend is built on first use)
+repository = AsyncRepository(
+    create_repository,
+    max_workers=int(os.getenv("DB_MAX_WORKERS", "32")),
+)
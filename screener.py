@@ -0,0 +1,141 @@
+import asyncio
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set
+
+import numpy as np
+
+from cache import CACHE_TTL, cached
+from invalidation import bus
+from price_store import stock_price_store
+from repository import repository
+
+TEXT_COLUMNS = ("symbol", "name", "sector", "industry")
+NUMERIC_COLUMNS = ("market_cap", "price", "pe_ratio", "pb_ratio", "roe", "debt_to_equity",
+                   "eps", "dividend_yield")
+# Fundamentals columns copied into the snapshot
+FUNDAMENTAL_COLUMNS = ("pe_ratio", "pb_ratio", "roe", "debt_to_equity", "eps", "dividend_yield")
+# Columns a screen can be sorted by
+SORT_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS
+
+
+class ScreenerSnapshot:
+    """Columnar join of stocks, latest fundamentals and latest price
+
+    Filters are evaluated as boolean masks over whole columns and results are
+    ordered with a single argsort, so a screen over thousands of symbols costs
+    a few vector operations plus building the ``limit`` output rows.
+    """
+
+    def __init__(self, stocks: Sequence[Dict[str, Any]], fundamentals: Sequence[Dict[str, Any]],
+                 prices: Dict[str, float]):
+        latest = {row["symbol"]: row for row in fundamentals}
+        self.size = len(stocks)
+        self.index = {stock["symbol"]: i for i, stock in enumerate(stocks)}
+        self.columns: Dict[str, np.ndarray] = {}
+        for name in TEXT_COLUMNS:
+            self.columns[name] = np.array([stock.get(name) or "" for stock in stocks], dtype=str)
+        self.columns["market_cap"] = _floats(stock.get("market_cap") for stock in stocks)
+        self.columns["price"] = _floats(prices.get(stock["symbol"]) for stock in stocks)
+        for name in FUNDAMENTAL_COLUMNS:
+            self.columns[name] = _floats(latest.get(stock["symbol"], {}).get(name) for stock in stocks)
+
+    def update_prices(self, prices: Dict[str, float]):
+        """Patch the latest price of the given symbols in place"""
+        for symbol, price in prices.items():
+            i = self.index.get(symbol)
+            if i is not None:
+                self.columns["price"][i] = price
+
+    def screen(self, min_market_cap: Optional[float] = None, max_market_cap: Optional[float] = None,
+               min_pe_ratio: Optional[float] = None, max_pe_ratio: Optional[float] = None,
+               min_roe: Optional[float] = None, sectors: Optional[Sequence[str]] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None,
+               sort_by: str = "market_cap", sort_desc: bool = True, limit: int = 50) -> List[Dict[str, Any]]:
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by '{sort_by}', expected one of {sorted(SORT_COLUMNS)}")
+        if limit < 0:
+            raise ValueError("limit must not be negative")
+
+        mask = np.ones(self.size, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            for column, bound, lower in (
+                ("market_cap", min_market_cap, True), ("market_cap", max_market_cap, False),
+                ("pe_ratio", min_pe_ratio, True), ("pe_ratio", max_pe_ratio, False),
+                ("roe", min_roe, True),
+                ("price", min_price, True), ("price", max_price, False),
+            ):
+                if bound is not None:
+                    values = self.columns[column]
+                    mask &= values >= bound if lower else values <= bound
+        if sectors:
+            mask &= np.isin(self.columns["sector"], list(sectors))
+
+        selected = np.flatnonzero(mask)
+        values = self.columns[sort_by][selected]
+        if sort_by in NUMERIC_COLUMNS:
+            # Missing values sort last in both directions
+            order = np.argsort(-values if sort_desc else values, kind="stable")
+        else:
+            order = np.argsort(values, kind="stable")
+            if sort_desc:
+                order = order[::-1]
+        return [self._row(i) for i in selected[order[:limit]].tolist()]
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        row = {name: self.columns[name][i].item() or None for name in TEXT_COLUMNS}
+        for name in NUMERIC_COLUMNS:
+            value = self.columns[name][i].item()
+            row[name] = None if value != value else value
+        return row
+
+
+def _floats(values) -> np.ndarray:
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+
+async def _latest_prices(snapshots: List[Dict[str, Any]]) -> Dict[str, float]:
+    if await stock_price_store.ensure_loaded():
+        return {symbol: float(series.close[-1]) for symbol, series in stock_price_store.series.items()
+                if series.length}
+    closes = ((row["symbol"], (row.get("latest_price") or {}).get("close_price")) for row in snapshots)
+    return {symbol: close for symbol, close in closes if close is not None}
+
+
+@cached("screener_snapshot", ttl=CACHE_TTL, max_entries=1, invalidated_by=("stocks", "fundamentals"))
+async def _build_snapshot() -> ScreenerSnapshot:
+    """Build (or reuse) the screener snapshot"""
+    # Latest fundamentals come from the trigger-maintained snapshots, one row per stock
+    stocks, snapshots = await asyncio.gather(
+        repository.get_stocks(),
+        repository.get_snapshots('stock'),
+    )
+    fundamentals = [row["fundamentals"] for row in snapshots if row.get("fundamentals")]
+    return ScreenerSnapshot(stocks, fundamentals, await _latest_prices(snapshots))
+
+
+# Symbols with bars written since their price was last patched into the snapshot
+_written: Set[str] = set()
+
+
+def _prices_written(table: str, symbols: Optional[FrozenSet[str]]):
+    if symbols is None:
+        _build_snapshot.cache.invalidate()
+    else:
+        _written.update(symbols)
+
+
+async def get_screener_snapshot() -> ScreenerSnapshot:
+    """The cached screener snapshot, with the prices of symbols written since patched in from the price store"""
+    snapshot = await _build_snapshot()
+    if _written:
+        symbols = list(_written)
+        _written.difference_update(symbols)
+        if await stock_price_store.ensure_loaded():
+            series = ((symbol, stock_price_store.get(symbol)) for symbol in symbols)
+            snapshot.update_prices({symbol: float(s.close[-1]) for symbol, s in series if s is not None and s.length})
+        else:
+            _build_snapshot.cache.invalidate()
+            snapshot = await _build_snapshot()
+    return snapshot
+
+
+bus.subscribe(("stock_prices",), _prices_written)
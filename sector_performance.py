@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from price_store import PriceSeries, PriceStore, stock_price_store
+from invalidation import bus
+from repository import repository
+from versions import versions
+
+load_dotenv()
+
+# Seconds before the engine re-reads sectors and stocks (names, sectors, market caps)
+SECTORS_REFRESH = float(os.getenv("SECTORS_REFRESH", "300"))
+
+# sectors table column -> calendar days back to the base bar (None: last bar of the previous year)
+WINDOWS: Dict[str, Optional[int]] = {
+    "performance_1d": 0,
+    "performance_1w": 7,
+    "performance_1m": 30,
+    "performance_ytd": None,
+}
+PERIODS = {"1d": "performance_1d", "1w": "performance_1w", "1m": "performance_1m", "ytd": "performance_ytd"}
+
+
+def series_returns(series: Optional[PriceSeries]) -> np.ndarray:
+    """Percent return of one symbol's latest close over each window (NaN when there is no base bar)"""
+    returns = np.full(len(WINDOWS), np.nan)
+    if series is None or series.length < 2:
+        return returns
+    dates, close = series.dates, series.close
+    latest = dates[-1]
+    for i, days in enumerate(WINDOWS.values()):
+        if days == 0:
+            base = series.length - 2
+        elif days is None:
+            year_start = latest.astype("datetime64[Y]").astype("datetime64[D]")
+            # Last close of the previous year, else the first bar of this one
+            base = max(int(np.searchsorted(dates, year_start)) - 1, 0)
+        else:
+            base = int(np.searchsorted(dates, latest - np.timedelta64(days, "D"), side="right")) - 1
+        if 0 <= base < series.length - 1 and close[base]:
+            returns[i] = (close[-1] - close[base]) / close[base] * 100
+    return returns
+
+
+class SectorPerformanceEngine:
+    """Market-cap-weighted sector returns over 1d/1w/1m/YTD computed from stock prices
+
+    Per-stock returns are kept as an (stocks × windows) array and each sector
+    as running sums of ``cap × return`` and ``cap``. A full load aggregates
+    the universe with ``bincount``; a new bar only swaps the contribution of
+    its stock, so sectors stay current without rescanning the price table.
+    Sector and stock metadata are re-read every ``refresh_interval`` seconds;
+    when only the price store was reloaded (or re-mapped to a new shared
+    generation), the returns are recomputed from it against the metadata
+    already held.
+    """
+
+    def __init__(self, store: PriceStore,
+                 loader: Callable[[], Awaitable[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]],
+                 refresh_interval: float = SECTORS_REFRESH):
+        self.store = store
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+
+        self.sectors: List[Dict[str, Any]] = []
+        self.symbols: List[str] = []
+        self.symbol_index: Dict[str, int] = {}
+        self.sector_names: List[str] = []
+        self.stock_sectors = np.empty(0, dtype=np.int64)
+        self.caps = np.empty(0)
+        self.returns = np.empty((0, len(WINDOWS)))
+        self.weighted = np.empty((0, len(WINDOWS)))
+        self.weights = np.empty((0, len(WINDOWS)))
+
+        self.loaded_at: Optional[float] = None
+        self.store_loaded_at: Optional[float] = None
+        # Symbols whose bars another process wrote, folded in once the store has re-read them
+        self.dirty: Set[str] = set()
+        self._lock = asyncio.Lock()
+
+    async def ensure_loaded(self) -> bool:
+        """Load (or periodically reload) the engine; False when prices are unavailable"""
+        if not await self.store.ensure_loaded():
+            return False
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    sectors, stocks = await self.loader()
+                    self.load(sectors, stocks)
+        if self.store_loaded_at != self.store.loaded_at:
+            self.recompute()
+        elif self.dirty:
+            symbols, self.dirty = self.dirty, set()
+            self.apply_bars({"symbol": symbol} for symbol in symbols)
+        return True
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_interval
+
+    def invalidate(self, table: str, symbols: Optional[FrozenSet[str]] = None):
+        """Re-read sectors and stocks on next use (new bars arrive through apply_bars or the price store)"""
+        self.loaded_at = None
+
+    def prices_written(self, table: str, symbols: Optional[FrozenSet[str]] = None):
+        """Recompute the returns of stocks whose bars another process wrote"""
+        if symbols is not None:
+            self.dirty.update(symbols)
+
+    def load(self, sectors: List[Dict[str, Any]], stocks: Iterable[Dict[str, Any]]):
+        """Take new sector and stock metadata, then recompute every return and aggregate"""
+        self.sectors = sectors
+        self.sector_names = [sector["name"] for sector in sectors]
+        sector_index = {name: i for i, name in enumerate(self.sector_names)}
+        # Stocks in sectors without a sectors row are left out
+        stocks = [stock for stock in stocks if stock.get("sector") in sector_index]
+
+        self.symbols = [stock["symbol"] for stock in stocks]
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.stock_sectors = np.array([sector_index[stock["sector"]] for stock in stocks], dtype=np.int64)
+        self.caps = np.array([float(stock.get("market_cap") or 0) for stock in stocks])
+        self.loaded_at = time.monotonic()
+        self.recompute()
+
+    def recompute(self):
+        """Recompute every stock's returns and every sector's aggregate from the price store"""
+        self.returns = np.array([series_returns(self.store.get(symbol)) for symbol in self.symbols]).reshape(
+            len(self.symbols), len(WINDOWS))
+
+        valid = ~np.isnan(self.returns)
+        caps = self.caps[:, None] * valid
+        self.weighted = np.stack([
+            np.bincount(self.stock_sectors, weights=(caps * np.nan_to_num(self.returns))[:, i],
+                        minlength=len(self.sectors))
+            for i in range(len(WINDOWS))
+        ], axis=1)
+        self.weights = np.stack([
+            np.bincount(self.stock_sectors, weights=caps[:, i], minlength=len(self.sectors))
+            for i in range(len(WINDOWS))
+        ], axis=1)
+
+        self.store_loaded_at = self.store.loaded_at
+        self.dirty.clear()
+        versions.observe("sectors", None, self.all_sectors())
+
+    def apply_bars(self, bars: Iterable[Dict[str, Any]]):
+        """Fold newly written bars (already applied to the price store) into the sector returns"""
+        if self.loaded_at is None:
+            return
+        changed = False
+        for symbol in {bar["symbol"].upper() for bar in bars}:
+            i = self.symbol_index.get(symbol)
+            if i is None:
+                continue
+            old, new = self.returns[i], series_returns(self.store.get(symbol))
+            sector, cap = self.stock_sectors[i], self.caps[i]
+            old_valid, new_valid = ~np.isnan(old), ~np.isnan(new)
+            self.weighted[sector] += cap * (np.where(new_valid, new, 0) - np.where(old_valid, old, 0))
+            self.weights[sector] += cap * (new_valid.astype(float) - old_valid)
+            self.returns[i] = new
+            changed = True
+        if changed:
+            versions.bump("sectors")
+
+    def _performance(self) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.weights > 0, self.weighted / self.weights, np.nan)
+
+    def all_sectors(self) -> List[Dict[str, Any]]:
+        """Every sectors row with computed performance, best 1 day performance first"""
+        performance = np.round(self._performance(), 2)
+        rows = []
+        for sector, values in zip(self.sectors, performance.tolist()):
+            row = dict(sector)
+            for column, value in zip(WINDOWS, values):
+                # No priced constituents over the window: no figure, never the stored placeholder
+                row[column] = value if value == value else None
+            rows.append(row)
+        rows.sort(key=lambda row: -_number(row.get("performance_1d")))
+        return rows
+
+    def top_sectors(self, period: str = "1d", limit: int = 5) -> List[Dict[str, Any]]:
+        column = PERIODS.get(period, "performance_1d")
+        return sorted(self.all_sectors(), key=lambda row: -_number(row.get(column)))[:max(limit, 0)]
+
+
+def _number(value: Any) -> float:
+    """Sort key where missing values rank last"""
+    return float("-inf") if value is None else float(value)
+
+
+async def _load_from_repository():
+    return await asyncio.gather(
+        repository.get_sectors(),
+        repository.get_stocks('symbol, sector, market_cap'),
+    )
+
+
+# Global instance
+sector_engine = SectorPerformanceEngine(stock_price_store, _load_from_repository)
+bus.subscribe(("sectors", "stocks"), sector_engine.invalidate)
+bus.subscribe(("stock_prices",), sector_engine.prices_written, remote_only=True)
@@ -0,0 +1,44 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Types neither encoder handles natively (Decimal from Postgres numerics, pydantic models)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "item"):  # NumPy scalars
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize to compact JSON bytes with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by ``dumps``
+
+    Used as the app's default response class. Handlers on hot paths return it
+    directly with plain rows, which also skips FastAPI's ``jsonable_encoder``
+    pass over the payload.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,170 @@
+import asyncio
+import mmap
+import os
+import struct
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): stores stay process-local
+    fcntl = None
+
+MAGIC = b"FSPRICE1"
+# magic, generation, symbols, bars, published_at (wall clock, comparable across processes)
+HEADER = struct.Struct("<8sQQQd")
+ALIGNMENT = 64
+SYMBOL_DTYPE = np.dtype("S16")
+
+# Superseded generations left on disk for readers that read the counter just before a publish
+KEEP_GENERATIONS = 2
+
+
+class Segment(NamedTuple):
+    """One published generation: every symbol's bars concatenated, ``offsets`` delimiting them"""
+    generation: int
+    published_at: float
+    symbols: List[str]
+    offsets: np.ndarray
+    dates: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+
+class SharedPriceSegment:
+    """Host-wide copy of one price table in memory-mapped files, published by generation
+
+    Each generation is an immutable file ``<table>.<generation>`` that readers
+    map read-only, so every worker process serves the same pages without
+    copying them. A writer publishes by writing the next file under a
+    temporary name, renaming it into place and only then bumping the 8-byte
+    counter in ``<table>.generation``, so readers see either the old
+    generation or the complete new one. Publishers serialize on an ``flock``
+    of the counter file.
+    """
+
+    def __init__(self, directory: str, table: str, columns: Sequence[str]):
+        if fcntl is None:
+            raise RuntimeError("Shared price segments need fcntl.flock, which this platform lacks")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.table = table
+        self.column_names = tuple(columns)
+        self._fd = os.open(os.path.join(directory, f"{table}.generation"), os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < 8:
+            os.ftruncate(self._fd, 8)
+        self._counter = mmap.mmap(self._fd, 8)
+
+    def generation(self) -> int:
+        """Latest published generation (0 before the first publish)"""
+        return int.from_bytes(self._counter[:8], "little")
+
+    def acquire(self):
+        """Take the host-wide publish lock (blocking; call it off the event loop)"""
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def release(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @asynccontextmanager
+    async def locked(self):
+        """Hold the publish lock, waiting for it in a thread; cancelling the wait never leaks it"""
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self.acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread still takes the lock: hand it back as soon as it does
+            acquiring.add_done_callback(self._release_acquired)
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _release_acquired(self, acquiring: asyncio.Future):
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self.release()
+
+    def _path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{self.table}.{generation}")
+
+    def _layout(self, symbols: int, bars: int) -> List[tuple]:
+        """(dtype, count) of every array after the header, in file order"""
+        return ([(SYMBOL_DTYPE, symbols), (np.dtype(np.int64), symbols + 1), (np.dtype(np.int64), bars)]
+                + [(np.dtype(np.float64), bars)] * len(self.column_names))
+
+    def open(self) -> Optional[Segment]:
+        """Map the latest generation, or None if nothing has been published"""
+        for _ in range(3):
+            generation = self.generation()
+            if not generation:
+                return None
+            try:
+                with open(self._path(generation), "rb") as f:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                # Pruned between reading the counter and opening it; a newer one is published
+                continue
+            return self._parse(buffer)
+        return None
+
+    def _parse(self, buffer: mmap.mmap) -> Segment:
+        magic, generation, symbols, bars, published_at = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.table} segment {generation} is not a price segment")
+        arrays, offset = [], HEADER.size
+        for dtype, count in self._layout(symbols, bars):
+            offset += -offset % ALIGNMENT
+            arrays.append(np.frombuffer(buffer, dtype=dtype, count=count, offset=offset))
+            offset += dtype.itemsize * count
+        names, offsets, dates, *columns = arrays
+        return Segment(
+            generation=generation,
+            published_at=published_at,
+            symbols=[name.decode() for name in names.tolist()],
+            offsets=offsets,
+            dates=dates.view("datetime64[D]"),
+            columns=dict(zip(self.column_names, columns)),
+        )
+
+    def publish(self, series: Mapping[str, Any]) -> int:
+        """Write ``symbol -> PriceSeries`` as the next generation; call with the lock held"""
+        generation = self.generation() + 1
+        symbols = list(series)
+        counts = [series[symbol].length for symbol in symbols]
+        offsets = np.zeros(len(symbols) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        def concatenate(arrays, dtype):
+            return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+
+        arrays = [
+            np.array(symbols, dtype=SYMBOL_DTYPE),
+            offsets,
+            concatenate([series[symbol].dates for symbol in symbols], "datetime64[D]").view(np.int64),
+        ] + [concatenate([series[symbol].column(name) for symbol in symbols], np.float64)
+             for name in self.column_names]
+
+        temporary = self._path(generation) + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, generation, len(symbols), int(offsets[-1]), time.time()))
+            for array in arrays:
+                f.write(b"\0" * (-f.tell() % ALIGNMENT))
+                f.write(array.tobytes())
+        os.replace(temporary, self._path(generation))
+        self._counter[:8] = generation.to_bytes(8, "little")
+        self._prune(generation)
+        return generation
+
+    def _prune(self, generation: int):
+        """Unlink old generations; processes still mapping one keep it until they drop it"""
+        prefix = f"{self.table}."
+        for entry in os.scandir(self.directory):
+            suffix = entry.name[len(prefix):]
+            if entry.name.startswith(prefix) and suffix.isdigit() and int(suffix) <= generation - KEEP_GENERATIONS:
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+
+import metrics
+from etf_routes import get_cached_etfs_data
+from exposure import exposure_engine
+from price_store import etf_price_store, stock_price_store
+from rankings import ranking_engine
+from repository import repository
+from screener import get_screener_snapshot
+from sector_performance import sector_engine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Datasets preloaded before the worker reports ready: "all", a comma-separated
+# subset of WARMUP_DATASETS, or empty to load them lazily on first request
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "")
+
+# name -> loader; sectors and rankings read the stock price store, so order matters little
+WARMUP_DATASETS: Dict[str, Callable[[], Awaitable]] = {
+    "stock_prices": stock_price_store.ensure_loaded,
+    "etf_prices": etf_price_store.ensure_loaded,
+    "rankings": ranking_engine.ensure_loaded,
+    "sectors": sector_engine.ensure_loaded,
+    "holdings": exposure_engine.ensure_loaded,
+    "screener": get_screener_snapshot,
+    "etfs": get_cached_etfs_data,
+}
+
+
+def warmup_datasets(setting: str = STARTUP_WARMUP) -> List[str]:
+    """Dataset names selected by a STARTUP_WARMUP value"""
+    names = [name.strip() for name in setting.split(",") if name.strip()]
+    if names == ["all"]:
+        return list(WARMUP_DATASETS)
+    unknown = [name for name in names if name not in WARMUP_DATASETS]
+    if unknown:
+        raise ValueError(f"Unknown STARTUP_WARMUP datasets {unknown}, expected 'all' or some of {list(WARMUP_DATASETS)}")
+    return names
+
+
+async def _timed(loader: Callable[[], Awaitable]) -> float:
+    start_time = time.perf_counter()
+    await loader()
+    return time.perf_counter() - start_time
+
+
+async def warm_up(names: List[str]) -> Dict[str, float]:
+    """Load ``names`` concurrently; returns seconds per dataset (a failed one is logged and left lazy)"""
+    results = await asyncio.gather(*(_timed(WARMUP_DATASETS[name]) for name in names), return_exceptions=True)
+    timings = {}
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            metrics.dataset_errors.inc(name)
+            logger.warning("Warm-up of %s failed: %s", name, result)
+        else:
+            timings[name] = result
+    return timings
+
+
+async def start(names: List[str]) -> Dict[str, float]:
+    """Open the database backend, then warm ``names`` up; returns seconds per step"""
+    start_time = time.perf_counter()
+    await repository.connect()
+    timings = {"connect": time.perf_counter() - start_time}
+    if names:
+        timings.update(await warm_up(names))
+        loaded = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items())
+        logger.info("Ready in %.2fs (%s)", time.perf_counter() - start_time, loaded)
+    return timings
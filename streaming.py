@@ -0,0 +1,128 @@
+import csv
+import io
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from price_store import INTERVALS, PRICE_COLUMNS, PriceStore, resample_rows
+from repository import repository
+from serialization import FastJSONResponse, dumps
+from versions import versions
+
+# Rows read and encoded per chunk of a streamed response
+STREAM_PAGE_SIZE = 500
+
+STREAM_COLUMNS = ("symbol", "date") + PRICE_COLUMNS
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _project(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Trim database rows to the price store's columns, so both paths return the same records"""
+    return [{column: row.get(column) for column in STREAM_COLUMNS} for row in rows]
+
+
+async def iter_price_pages(store: PriceStore, symbol: str, days: int, page_size: int = STREAM_PAGE_SIZE,
+                           interval: str = "1d") -> AsyncIterator[List[Dict[str, Any]]]:
+    """The last ``days`` bars of ``symbol`` at ``interval``, newest first, one page at a time
+
+    Served from the price store when it is loaded, otherwise read from the
+    store's table with keyset paging, so only one page is held at a time
+    (resampled fallbacks read the whole window first).
+    """
+    if await store.ensure_loaded():
+        series = store.get(symbol)
+        if series is not None:
+            series, bars = series.window(days, interval)
+            for page in series.iter_rows(bars, page_size):
+                yield page
+        return
+
+    if interval != "1d":
+        rows = []
+        async for page in iter_price_pages(store, symbol, days, page_size):
+            rows.extend(page)
+        rows = resample_rows(symbol, rows, interval)
+        for start in range(0, len(rows), page_size):
+            yield rows[start:start + page_size]
+        return
+
+    remaining, before = days, None
+    while remaining > 0:
+        page = await repository.get_price_page(store.table, symbol, before, min(page_size, remaining))
+        if not page:
+            return
+        yield _project(page)
+        remaining -= len(page)
+        before = str(page[-1]["date"])
+
+
+async def _ndjson(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for page in pages:
+        yield b"".join(dumps(row) + b"\n" for row in page)
+
+
+async def _csv(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=STREAM_COLUMNS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    async for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _check_format(format: str):
+    if format != "json" and format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}', expected json, ndjson or csv")
+
+
+def _check_interval(interval: str):
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400,
+                            detail=f"Unsupported interval '{interval}', expected one of {', '.join(INTERVALS)}")
+
+
+def stream_prices(store: PriceStore, symbol: str, days: int, format: str, interval: str = "1d") -> StreamingResponse:
+    """Stream price history as NDJSON or CSV, encoding one page at a time"""
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Cannot stream format '{format}', expected ndjson or csv")
+    _check_interval(interval)
+    pages = iter_price_pages(store, symbol.upper(), days, interval=interval)
+    body = _ndjson(pages) if format == "ndjson" else _csv(pages)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format])
+
+
+async def price_history_response(request: Request, store: PriceStore, symbol: str, days: int, format: str,
+                                 fallback: Callable[[str, int], Awaitable[List[Dict[str, Any]]]],
+                                 interval: str = "1d") -> Response:
+    """Price history as JSON rows or a stream at ``interval``, with validators from the store's versions
+
+    Versions follow the price store, so ETag/Last-Modified are only issued (and
+    ``If-None-Match`` only answered with a 304) while it is loaded; the
+    ``fallback`` query is always answered in full, trimmed to ``STREAM_COLUMNS``.
+    """
+    _check_format(format)
+    _check_interval(interval)
+    symbol = symbol.upper()
+    loaded = await store.ensure_loaded()
+    if loaded:
+        not_modified = versions.not_modified(request, store.table, symbol)
+        if not_modified is not None:
+            return not_modified
+
+    if format != "json":
+        response = stream_prices(store, symbol, days, format, interval)
+    elif loaded:
+        response = FastJSONResponse(store.history(symbol, days, interval))
+    else:
+        response = FastJSONResponse(resample_rows(symbol, _project(await fallback(symbol, days)), interval))
+    if loaded:
+        versions.set_headers(response, store.table, symbol)
+    return response
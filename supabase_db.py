@@ -1,18 +1,42 @@
 import os
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
 class SupabaseDB:
+    """Supabase client wrapper
+    
+    The client (and the ``supabase`` package, which is slow to import) is only
+    created on first use, so importing this module reads no credentials and
+    opens nothing.
+    """
+    
     def __init__(self):
+        self._client: Optional["Client"] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def supabase(self) -> "Client":
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+    
+    def _connect(self) -> "Client":
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_KEY")
         
         if not url or not key:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
         
-        self.supabase: Client = create_client(url, key)
+        from supabase import create_client
+        return create_client(url, key)
     
     def create_tables(self):
         """Create tables in Supabase (run this once)"""
@@ -96,6 +120,85 @@ class SupabaseDB:
         CREATE INDEX IF NOT EXISTS idx_stock_prices_symbol_date ON stock_prices(symbol, date);
         CREATE INDEX IF NOT EXISTS idx_fundamentals_symbol ON fundamentals(symbol);
         CREATE INDEX IF NOT EXISTS idx_technical_symbol_date ON technical_indicators(symbol, date);
+
+        -- Create invalidations table: writes announced to every process serving the database
+        CREATE TABLE IF NOT EXISTS invalidations (
+            id BIGSERIAL PRIMARY KEY,
+            origin TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            symbols TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+
+        -- Create latest_snapshots table: newest price, previous close, fundamentals and
+        -- indicators of every symbol, kept current by the triggers below
+        CREATE TABLE IF NOT EXISTS latest_snapshots (
+            kind VARCHAR(5) NOT NULL,
+            symbol VARCHAR(10) NOT NULL,
+            latest_price JSONB,
+            previous_close DECIMAL(10,4),
+            fundamentals JSONB,
+            technical_indicators JSONB,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (kind, symbol)
+        );
+
+        CREATE OR REPLACE FUNCTION refresh_latest_snapshot() RETURNS TRIGGER AS $$
+        DECLARE
+            target_symbol TEXT := CASE WHEN TG_OP = 'DELETE' THEN OLD.symbol ELSE NEW.symbol END;
+            target_kind TEXT := CASE WHEN TG_TABLE_NAME = 'etf_prices' THEN 'etf' ELSE 'stock' END;
+        BEGIN
+            INSERT INTO latest_snapshots (kind, symbol) VALUES (target_kind, target_symbol) ON CONFLICT DO NOTHING;
+            IF TG_TABLE_NAME IN ('stock_prices', 'etf_prices') THEN
+                EXECUTE format(
+                    'UPDATE latest_snapshots SET
+                         latest_price = (SELECT to_jsonb(p) FROM %1$I p WHERE p.symbol = $1 ORDER BY date DESC LIMIT 1),
+                         previous_close = (SELECT close_price FROM %1$I WHERE symbol = $1 ORDER BY date DESC LIMIT 1 OFFSET 1),
+                         updated_at = NOW()
+                     WHERE kind = $2 AND symbol = $1', TG_TABLE_NAME)
+                USING target_symbol, target_kind;
+            ELSIF TG_TABLE_NAME = 'fundamentals' THEN
+                UPDATE latest_snapshots SET
+                    fundamentals = (SELECT to_jsonb(f) FROM fundamentals f WHERE f.symbol = target_symbol
+                                    ORDER BY year DESC, quarter DESC LIMIT 1),
+                    updated_at = NOW()
+                WHERE kind = 'stock' AND symbol = target_symbol;
+            ELSE
+                UPDATE latest_snapshots SET
+                    technical_indicators = (SELECT to_jsonb(t) FROM technical_indicators t WHERE t.symbol = target_symbol
+                                            ORDER BY date DESC LIMIT 1),
+                    updated_at = NOW()
+                WHERE kind = 'stock' AND symbol = target_symbol;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS stock_prices_snapshot ON stock_prices;
+        CREATE TRIGGER stock_prices_snapshot AFTER INSERT OR UPDATE OR DELETE ON stock_prices
+            FOR EACH ROW EXECUTE FUNCTION refresh_latest_snapshot();
+        DROP TRIGGER IF EXISTS fundamentals_snapshot ON fundamentals;
+        CREATE TRIGGER fundamentals_snapshot AFTER INSERT OR UPDATE OR DELETE ON fundamentals
+            FOR EACH ROW EXECUTE FUNCTION refresh_latest_snapshot();
+        DROP TRIGGER IF EXISTS technical_indicators_snapshot ON technical_indicators;
+        CREATE TRIGGER technical_indicators_snapshot AFTER INSERT OR UPDATE OR DELETE ON technical_indicators
+            FOR EACH ROW EXECUTE FUNCTION refresh_latest_snapshot();
+
+        -- Backfill snapshots from rows written before the triggers existed
+        INSERT INTO latest_snapshots (kind, symbol, latest_price, previous_close)
+        SELECT 'stock', p.symbol, to_jsonb(p),
+               (SELECT close_price FROM stock_prices q WHERE q.symbol = p.symbol ORDER BY date DESC LIMIT 1 OFFSET 1)
+        FROM (SELECT DISTINCT ON (symbol) * FROM stock_prices ORDER BY symbol, date DESC) p
+        ON CONFLICT (kind, symbol) DO UPDATE
+            SET latest_price = EXCLUDED.latest_price, previous_close = EXCLUDED.previous_close;
+        INSERT INTO latest_snapshots (kind, symbol, fundamentals)
+        SELECT 'stock', f.symbol, to_jsonb(f)
+        FROM (SELECT DISTINCT ON (symbol) * FROM fundamentals ORDER BY symbol, year DESC, quarter DESC) f
+        ON CONFLICT (kind, symbol) DO UPDATE SET fundamentals = EXCLUDED.fundamentals;
+        INSERT INTO latest_snapshots (kind, symbol, technical_indicators)
+        SELECT 'stock', t.symbol, to_jsonb(t)
+        FROM (SELECT DISTINCT ON (symbol) * FROM technical_indicators ORDER BY symbol, date DESC) t
+        ON CONFLICT (kind, symbol) DO UPDATE SET technical_indicators = EXCLUDED.technical_indicators;
         """
         
         print("Copy and paste this SQL into Supabase SQL Editor:")
@@ -125,5 +228,5 @@ class SupabaseDB:
     def get_sectors(self):
         return self.supabase.table('sectors').select('*').order('performance_1d', desc=True).execute()
 
-# Global instance
+# Global instance (connects on first use)
 supabase_db = SupabaseDB()
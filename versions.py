@@ -0,0 +1,94 @@
+import hashlib
+import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from serialization import FastJSONResponse
+
+# Distinguishes this process's ETags from those issued before a restart
+BOOT_ID = f"{int(time.time() * 1000):x}"
+
+
+class DatasetVersions:
+    """Per-dataset (and per-key, e.g. per-symbol) version counters
+
+    A version bumps when the API writes to the dataset (``bump``) or when a
+    reload observes content that differs from the previous load (``observe``),
+    which catches writes made by other processes. Versions are exposed as
+    ETag/Last-Modified so polling clients can revalidate with a 304 that
+    costs neither a query nor serialization.
+    """
+
+    def __init__(self):
+        self._versions: Dict[Tuple[str, Optional[Hashable]], Tuple[int, float]] = {}
+        self._digests: Dict[Tuple[str, Optional[Hashable]], str] = {}
+        self._started = time.time()
+
+    def bump(self, dataset: str, key: Optional[Hashable] = None):
+        """Record a write to ``dataset`` (``key=None``: the whole dataset)"""
+        version, _ = self._versions.get((dataset, key), (0, self._started))
+        self._versions[(dataset, key)] = (version + 1, time.time())
+
+    def observe(self, dataset: str, key: Optional[Hashable], value: Any):
+        """Bump the version when a freshly loaded ``value`` differs from the last one seen"""
+        digest = hashlib.blake2b(json.dumps(value, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+        previous = self._digests.get((dataset, key))
+        self._digests[(dataset, key)] = digest
+        if previous is not None and previous != digest:
+            self.bump(dataset, key)
+
+    def current(self, dataset: str, key: Optional[Hashable] = None) -> Tuple[str, float]:
+        """The (ETag, last modified timestamp) of ``dataset`` / ``key``"""
+        dataset_version, dataset_modified = self._versions.get((dataset, None), (0, self._started))
+        if key is None:
+            return f'W/"{BOOT_ID}.{dataset_version}"', dataset_modified
+        key_version, key_modified = self._versions.get((dataset, key), (0, self._started))
+        return f'W/"{BOOT_ID}.{dataset_version}.{key_version}"', max(dataset_modified, key_modified)
+
+    def not_modified(self, request: Request, dataset: str, key: Optional[Hashable] = None) -> Optional[Response]:
+        """A 304 response when the request's validators match the current version, else None"""
+        etag, modified = self.current(dataset, key)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison: W/"x" and "x" match
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            matched = "*" in tags or etag.removeprefix("W/") in tags
+        else:
+            matched = _not_modified_since(request.headers.get("if-modified-since"), modified)
+        if not matched:
+            return None
+        response = Response(status_code=304)
+        self.set_headers(response, dataset, key)
+        return response
+
+    def conditional(self, request: Request, value: Any, dataset: str, key: Optional[Hashable] = None) -> Response:
+        """``value`` as JSON with validators, or a 304 when the client's copy is current"""
+        not_modified = self.not_modified(request, dataset, key)
+        if not_modified is not None:
+            return not_modified
+        response = FastJSONResponse(value)
+        self.set_headers(response, dataset, key)
+        return response
+
+    def set_headers(self, response: Response, dataset: str, key: Optional[Hashable] = None):
+        etag, modified = self.current(dataset, key)
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = formatdate(modified, usegmt=True)
+        # Caches may keep the body but must revalidate before reusing it
+        response.headers["Cache-Control"] = "no-cache"
+
+
+def _not_modified_since(header: Optional[str], modified: float) -> bool:
+    if not header:
+        return False
+    try:
+        return int(modified) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+# Global instance
+versions = DatasetVersions()